@@ -4,15 +4,575 @@ Extends the Serial class to allow string-based IO methods, as well as add
 other methods for common S-Fifteen instruments device responses.
 """
 
+import collections
+import contextlib
+import functools
 import glob
+import inspect
+import io
+import json
+import logging
+import math
+import os
+import select
+import statistics
 import sys
+import threading
 import time
-from typing import List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import serial
+from serial.tools import list_ports
+from serial.tools.list_ports_common import ListPortInfo
 
 
-def search_for_serial_devices(device: str) -> List[str]:
+DISCOVERY_WORKERS: int = 32  # maximum number of ports probed concurrently
+
+# USB vendor IDs of the microcontrollers used in S-Fifteen instruments devices
+USB_VENDOR_IDS = {
+    0x03EB,  # Atmel / Microchip
+}
+
+# Identity strings of previously identified devices, keyed by USB serial number
+_identity_cache: Dict[str, str] = {}
+
+logger = logging.getLogger(__name__)
+
+
+class SerialDeviceInfo(NamedTuple):
+    """Identified serial device, see `discover_serial_devices()`."""
+
+    port: str
+    identity: str
+    serial_number: Optional[str] = None  # USB serial number, if any
+
+
+def synchronized(method):
+    """Runs the method with exclusive access to the device.
+
+    Applicable to methods of classes providing an `reserve()` context
+    manager, e.g. `SerialConnection.reserve()`.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.reserve():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _synchronized_read(method):
+    """Like `synchronized()`, but only while the background reader is stopped.
+
+    With the background reader, the read method sends its request with the
+    device reserved, see `SerialConnection.request()`, but waits for the reply
+    without it, so that other threads can send requests meanwhile.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._reader is not None:
+            return method(self, *args, **kwargs)
+        with self.reserve():
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class CommandRecord(NamedTuple):
+    """Timing of a single command, see `SerialConnection.enable_instrumentation()`."""
+
+    method: str  # e.g. "getresponse"
+    command: str
+    timestamp: float  # start, as given by time.time()
+    duration: float  # in seconds, excluding the wait for device access
+    first_byte: Optional[float]  # from end of write to first reply byte, in seconds
+    bytes_out: int
+    bytes_in: int
+    timed_out: bool
+
+
+class _Measurement:
+    """Counters of the command in progress, updated by the IO methods."""
+
+    __slots__ = ("bytes_out", "bytes_in", "write_end", "first_byte")
+
+    def __init__(self):
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.write_end: Optional[float] = None
+        self.first_byte: Optional[float] = None
+
+
+class _PendingRequest:
+    """Command awaiting its reply lines, see `SerialConnection.request()`."""
+
+    __slots__ = (
+        "cmd",
+        "count",
+        "future",
+        "lines",
+        "start",
+        "deadline",
+        "last_line",
+        "suspect",
+        "measurement",
+    )
+
+    def __init__(self, cmd: str, count: Optional[int], future: Future, timeout: float):
+        self.cmd = cmd
+        self.count = count  # None if open-ended, see `SerialConnection.request()`
+        self.future = future
+        self.lines: List[str] = []
+        self.start = time.time()  # for the timeout policy
+        self.deadline = time.monotonic() + timeout
+        self.last_line = 0.0  # monotonic time of the latest line received
+        self.suspect = False  # pending while an earlier request timed out
+        self.measurement: Optional[_Measurement] = None  # see `instrumented()`
+
+
+def command_mnemonic(cmd: str) -> str:
+    """Returns the command without arguments, e.g. "HVOLT" for "hvolt 1.000".
+
+    Chained commands are joined with ';', e.g. "STATUS?;LCURRENT?".
+    """
+    return ";".join(part.split()[0].upper() for part in cmd.split(";") if part.strip())
+
+
+class LatencyEstimate(NamedTuple):
+    """Response time statistics of a command, see `AdaptiveTimeoutPolicy`."""
+
+    mean: float  # in seconds
+    variance: float  # in seconds squared
+    count: int  # number of observations
+
+
+class AdaptiveTimeoutPolicy:
+    """Read timeouts per command, learned from observed response times.
+
+    Tracks the exponentially weighted mean and variance of the response time
+    of each command mnemonic, see `command_mnemonic()`. The timeout is set
+    above a high quantile of the response time, at
+    `(1 + margin) * mean + deviations * std` within [`minimum`, `maximum`].
+    The relative margin covers jitter not seen while learning. Slow commands
+    thus get enough time without raising the timeout of all commands.
+
+    Learned timeouts only extend timeouts, never shorten them: `SerialConnection`
+    and `SPDCDriver` use them no shorter than the device timeout, see
+    `SerialConnection.getresponse()`, so that a reply delayed by a few ms still
+    counts. Missing replies to fast queries thus do not fail any faster.
+
+    A timed out reply only shows that the response time exceeds the timeout,
+    so the estimate is raised by `TIMEOUT_BACKOFF` instead.
+
+    Examples:
+        >>> policy = AdaptiveTimeoutPolicy("timeouts.json")
+        >>> connection = SerialConnection("/dev/ttyACM0", timeout_policy=policy)
+        ...
+        >>> policy.save()
+    """
+
+    TIMEOUT_BACKOFF: float = 2.0  # factor raising the mean after timeouts
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        alpha: float = 0.1,
+        deviations: float = 4.0,
+        margin: float = 0.5,
+        minimum: float = 0.02,
+        maximum: float = 5.0,
+        min_samples: int = 5,
+    ):
+        """Initializes the policy, loading learned timeouts from 'path' if present.
+
+        Args:
+            path: JSON file persisting the learned response times, if any.
+            alpha: Weight of each new observation, between 0 and 1.
+            deviations: Number of standard deviations above the mean.
+            margin: Additional headroom, relative to the mean.
+            minimum: Lower bound of the timeouts, in seconds.
+            maximum: Upper bound of the timeouts, in seconds.
+            min_samples: Observations of a command before its timeout is used.
+        """
+        self.path = path
+        self.alpha = alpha
+        self.deviations = deviations
+        self.margin = margin
+        self.minimum = minimum
+        self.maximum = maximum
+        self.min_samples = min_samples
+        self.estimates: Dict[str, LatencyEstimate] = {}
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def timeout(
+        self,
+        cmd: str,
+        default: Optional[float] = None,
+        minimum: Optional[float] = None,
+    ) -> Optional[float]:
+        """Returns the learned timeout of 'cmd' in seconds, or 'default'.
+
+        The default is returned until enough responses have been observed.
+
+        Args:
+            cmd: Command to send.
+            default: Timeout returned if none is learned yet.
+            minimum: Lower bound of the learned timeout, overriding
+                `self.minimum` if larger.
+        """
+        estimate = self.estimates.get(command_mnemonic(cmd))
+        if estimate is None or estimate.count < self.min_samples:
+            return default
+        timeout = (1 + self.margin) * estimate.mean + self.deviations * math.sqrt(
+            estimate.variance
+        )
+        minimum = self.minimum if minimum is None else max(minimum, self.minimum)
+        return min(max(timeout, minimum), max(self.maximum, minimum))
+
+    def observe(self, cmd: str, duration: float, timed_out: bool = False) -> None:
+        """Updates the estimate of 'cmd' with a response time, in seconds.
+
+        Args:
+            cmd: Command sent.
+            duration: Time from sending the command until the reply completed,
+                or until the timeout if 'timed_out'.
+            timed_out: Reply not complete before the timeout.
+        """
+        mnemonic = command_mnemonic(cmd)
+        estimate = self.estimates.get(mnemonic)
+        if estimate is None:
+            mean = duration * self.TIMEOUT_BACKOFF if timed_out else duration
+            self.estimates[mnemonic] = LatencyEstimate(min(mean, self.maximum), 0, 1)
+            return
+        if timed_out:
+            mean = max(estimate.mean, duration) * self.TIMEOUT_BACKOFF
+            self.estimates[mnemonic] = LatencyEstimate(
+                min(mean, self.maximum), estimate.variance, estimate.count + 1
+            )
+            return
+        # Exponentially weighted moving mean and variance
+        delta = duration - estimate.mean
+        mean = estimate.mean + self.alpha * delta
+        variance = (1 - self.alpha) * (estimate.variance + self.alpha * delta**2)
+        self.estimates[mnemonic] = LatencyEstimate(mean, variance, estimate.count + 1)
+
+    def load(self, path: str) -> None:
+        """Loads learned response times, see `save()`.
+
+        Raises:
+            OSError: File cannot be read.
+            ValueError: File content is invalid.
+        """
+        with open(path) as f:
+            content = json.load(f)
+        try:
+            self.estimates.update(
+                {key: LatencyEstimate(*value) for key, value in content.items()}
+            )
+        except (AttributeError, TypeError) as e:
+            raise ValueError(f"Invalid timeout file '{path}'") from e
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Saves learned response times to 'path', defaulting to `self.path`.
+
+        Raises:
+            OSError: File cannot be written.
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save timeouts to")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({key: list(value) for key, value in self.estimates.items()}, f)
+
+
+def instrumented(method):
+    """Records the timing of the IO method, if instrumentation is enabled.
+
+    Applicable to `SerialConnection` methods taking the command as first
+    argument, and an optional read timeout. Commands issued by a thread while
+    it records another, e.g. the `writeline()` in `getresponse()`, are counted
+    as part of the outer command. Replies received by the background reader
+    are counted for the request they are matched to.
+    """
+
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, cmd, *args, **kwargs):
+        if self._records is None or self._measurement is not None:
+            return method(self, cmd, *args, **kwargs)
+
+        timeout = None
+        if method.__name__ != "writeline":
+            bound = signature.bind(self, cmd, *args, **kwargs)
+            timeout = self._response_timeout(cmd, bound.arguments.get("timeout"))
+
+        measurement = self._measurement = _Measurement()
+        timestamp, start = time.time(), time.perf_counter()
+        timed_out = False
+        try:
+            return method(self, cmd, *args, **kwargs)
+        except serial.SerialTimeoutException:
+            timed_out = True
+            raise
+        finally:
+            end = time.perf_counter()
+            self._measurement = None
+            if timeout is not None:
+                # Read methods only run into their timeout without a full reply
+                timed_out = timed_out or end - start >= timeout
+            first_byte = None
+            if measurement.first_byte is not None and measurement.write_end is not None:
+                first_byte = measurement.first_byte - measurement.write_end
+            records = self._records
+            if records is not None:
+                records.append(
+                    CommandRecord(
+                        method.__name__,
+                        cmd,
+                        timestamp,
+                        end - start,
+                        first_byte,
+                        measurement.bytes_out,
+                        measurement.bytes_in,
+                        timed_out,
+                    )
+                )
+
+    return wrapper
+
+
+def _list_serial_ports() -> List[str]:
+    """Returns the list of candidate device paths for the current platform.
+
+    Raises:
+        EnvironmentError: Unsupported OS.
+    """
+    if sys.platform.startswith("win"):
+        return [f"COM{i}" for i in range(1, 257)]
+    elif sys.platform.startswith("linux") or sys.platform.startswith("cygwin"):
+        # this excludes your current terminal "/dev/tty"
+        return glob.glob("/dev/tty[A-Za-z]*")
+    elif sys.platform.startswith("darwin"):
+        return glob.glob("/dev/tty.*")
+    else:
+        raise EnvironmentError("Unsupported platform")
+
+
+def _identify_port(port: str, timeout: float) -> Optional[str]:
+    """Returns the identity string of the device at 'port'.
+
+    Args:
+        port: Device path.
+        timeout: Read timeout used for the identification request, in seconds.
+    Returns:
+        Device identifier, or None if the port cannot be opened.
+    Note:
+        The port is opened for exclusive access, so that ports locked by
+        other programs are not probed. The lock is advisory on POSIX, see
+        `serial.Serial`.
+    """
+    try:
+        s = SerialConnection(port, timeout=timeout, exclusive=True)
+        try:
+            return s.getresponse("*IDN?")
+        finally:
+            s.close()  # guarantee port is closed
+    except (serial.SerialException, OSError):
+        return None
+
+
+def _is_plausible_port(info: ListPortInfo, device: str) -> bool:
+    """Returns True if the USB metadata of the port suggests a matching device.
+
+    Args:
+        info: Port metadata from `serial.tools.list_ports`.
+        device: Name of target device.
+    """
+    if info.vid is None:
+        return False  # not a USB device
+    if info.vid in USB_VENDOR_IDS:
+        return True
+    fields = (info.product, info.manufacturer, info.description, info.serial_number)
+    return any(device in field for field in fields if field)
+
+
+def clear_identity_cache() -> None:
+    """Forgets identities of devices found in previous scans."""
+    _identity_cache.clear()
+
+
+def discover_serial_devices(
+    device: str,
+    timeout: float = 0.1,
+    max_workers: int = DISCOVERY_WORKERS,
+    use_metadata: bool = True,
+    ports: Optional[Iterable[str]] = None,
+    probe_all: bool = False,
+    exclude: Iterable[str] = (),
+) -> Iterator[SerialDeviceInfo]:
+    """Yields serial devices with corresponding device name, as they are found.
+
+    If `use_metadata` is set, the candidate ports are first filtered using the
+    USB metadata (vendor ID, product string, serial number) reported by the OS,
+    so that unrelated devices are not sent identification requests. If no
+    port passes the filter, e.g. for boards with unknown vendor IDs, all ports
+    are probed only if `probe_all` is set.
+
+    The identity of devices with a USB serial number is cached, so that ports
+    of previously identified devices are not probed again.
+
+    Ports are probed concurrently by a bounded pool of threads, so the total
+    scan duration is bound by the slowest port instead of the sum over all
+    ports. Matches are yielded in order of identification.
+
+    Args:
+        device: Name of target device.
+        timeout: Per-port deadline for the identification request, in seconds.
+        max_workers: Maximum number of ports probed concurrently.
+        use_metadata: Filter candidate ports using USB metadata.
+        ports: Restricts the scan to these device paths, if specified.
+        probe_all: Probe all ports if none passes the metadata filter.
+        exclude: Device paths never probed, e.g. ports already in use.
+    Yields:
+        Devices for which 'device' partially matches the returned identifier
+        from a device identification request.
+    Raises:
+        EnvironmentError: Unsupported OS.
+    """
+    infos = list_ports.comports()
+    serial_numbers = {info.device: info.serial_number for info in infos}
+    candidates = []
+    if use_metadata:
+        candidates = [
+            info.device for info in infos if _is_plausible_port(info, device)
+        ]
+        if ports is not None:
+            candidates = [port for port in candidates if port in ports]
+    if not use_metadata or (probe_all and not candidates):
+        candidates = _list_serial_ports() if ports is None else list(ports)
+    ports = [port for port in candidates if port not in set(exclude)]
+
+    pending = []
+    for port in ports:
+        serial_number = serial_numbers.get(port)
+        id_str = _identity_cache.get(serial_number) if serial_number else None
+        if id_str is None:
+            pending.append(port)
+        elif device in id_str:
+            yield SerialDeviceInfo(port, id_str, serial_number)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            pool.submit(_identify_port, port, timeout): port for port in pending
+        }
+        for future in as_completed(futures):
+            port = futures[future]
+            id_str = future.result()
+            if not id_str:
+                continue
+            serial_number = serial_numbers.get(port)
+            if serial_number:
+                _identity_cache[serial_number] = id_str
+            if device in id_str:
+                yield SerialDeviceInfo(port, id_str, serial_number)
+    finally:
+        # Do not hold up the caller if iteration is stopped early
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_serial_devices(
+    device: str,
+    timeout: float = 0.1,
+    max_workers: int = DISCOVERY_WORKERS,
+    probe_all: bool = False,
+    exclude: Iterable[str] = (),
+) -> Iterator[str]:
+    """Yields device paths with corresponding device name, as they are found.
+
+    See `discover_serial_devices()`.
+
+    Args:
+        device: Name of target device.
+        timeout: Per-port deadline for the identification request, in seconds.
+        max_workers: Maximum number of ports probed concurrently.
+        probe_all: Probe all ports if none passes the USB metadata filter.
+        exclude: Device paths never probed, e.g. ports already in use.
+    Yields:
+        Device paths for which 'device' partially matches the returned
+        identifier from a device identification request.
+    Raises:
+        EnvironmentError: Unsupported OS.
+    """
+    for info in discover_serial_devices(
+        device, timeout, max_workers, probe_all=probe_all, exclude=exclude
+    ):
+        yield info.port
+
+
+def usb_serial_number(port: str) -> Optional[str]:
+    """Returns the USB serial number of the device at 'port', if any."""
+    for info in list_ports.comports():
+        if info.device == port:
+            return info.serial_number
+    return None
+
+
+def find_known_device(
+    identity: str,
+    port: str,
+    serial_number: Optional[str] = None,
+    timeout: float = 0.1,
+) -> Optional[str]:
+    """Returns the path of a previously identified device, if still connected.
+
+    The device is looked up by its USB serial number first, since the port
+    name may change between reconnects, then by 'port'. A single
+    identification request is sent to confirm the device identity.
+
+    Args:
+        identity: Expected identifier returned by the device.
+        port: Last known device path.
+        serial_number: USB serial number of the device, if any.
+        timeout: Read timeout used for the identification request, in seconds.
+    Returns:
+        Device path, or None if the device is not found.
+    """
+    if serial_number:
+        for info in list_ports.comports():
+            if info.serial_number == serial_number:
+                port = info.device
+                break
+    if _identify_port(port, timeout) == identity:
+        return port
+    return None
+
+
+def search_for_serial_devices(
+    device: str,
+    timeout: float = 0.1,
+    max_workers: int = DISCOVERY_WORKERS,
+    probe_all: bool = False,
+) -> List[str]:
     """Returns a list of device paths with corresponding device name.
 
     If the device identification string contains the string given in the input
@@ -23,35 +583,83 @@ def search_for_serial_devices(device: str) -> List[str]:
 
     Args:
         device: Name of target device.
+        timeout: Per-port deadline for the identification request, in seconds.
+        max_workers: Maximum number of ports probed concurrently, see
+            `iter_serial_devices()`. Use 1 for a sequential scan.
+        probe_all: Probe all ports if none passes the USB metadata filter.
     Returns:
         List of device paths for which 'device' partially matches the returned
         identifier from a device identification request.
     Raises:
         EnvironmentError: Unsupported OS.
     """
-    if sys.platform.startswith("win"):
-        ports = [f"COM{i}" for i in range(1, 257)]
-    elif sys.platform.startswith("linux") or sys.platform.startswith("cygwin"):
-        # this excludes your current terminal "/dev/tty"
-        ports = glob.glob("/dev/tty[A-Za-z]*")
-    elif sys.platform.startswith("darwin"):
-        ports = glob.glob("/dev/tty.*")
-    else:
-        raise EnvironmentError("Unsupported platform")
+    ports = iter_serial_devices(device, timeout, max_workers, probe_all)
+    return sorted(ports, key=lambda port: (len(port), port))  # COM2 before COM10
 
-    result = []
-    for port in ports:
-        try:
-            s = SerialConnection(port)
-            try:
-                id_str = s.getresponse("*IDN?")
-            finally:
-                s.close()  # guarantee port is closed
-            if device in id_str:
-                result.append(port)
-        except serial.SerialException:
-            pass
-    return result
+
+class SerialPortMonitor:
+    """Tracks devices with corresponding device name being (un)plugged.
+
+    Each call to `poll()` lists the ports reported by the OS, which is cheap,
+    and only probes ports that appeared since the previous call. Ports that
+    are not identified on their first probe are probed once more on the next
+    poll, since some boards ignore queries right after being plugged in.
+
+    Examples:
+        >>> monitor = SerialPortMonitor("SPDC", known_devices=["COM4"])
+        >>> added, removed = monitor.poll()
+    """
+
+    def __init__(
+        self,
+        device: str,
+        timeout: float = 0.1,
+        known_devices: Optional[Iterable[str]] = None,
+    ):
+        """Initializes the monitor with the ports currently present.
+
+        Args:
+            device: Name of target device.
+            timeout: Per-port deadline for the identification request, in seconds.
+            known_devices: Paths of matching devices already found, if any.
+        """
+        self.device = device
+        self.timeout = timeout
+        self.devices: Set[str] = set(known_devices or ())
+        # Ports never probed, e.g. that of the connected device. Replace
+        # instead of modifying in place when used from other threads.
+        self.in_use: Set[str] = set()
+        self._ports: Set[str] = self._current_ports()
+        self._retry: Set[str] = set()
+
+    @staticmethod
+    def _current_ports() -> Set[str]:
+        return {info.device for info in list_ports.comports()}
+
+    def poll(self) -> Tuple[List[str], List[str]]:
+        """Returns the matching device paths added and removed since last poll.
+
+        Raises:
+            EnvironmentError: Unsupported OS.
+        """
+        ports = self._current_ports()
+        new_ports = (ports - self._ports) | (self._retry & ports)
+        removed = sorted(self.devices - ports)
+        self._ports = ports
+        self.devices -= set(removed)
+
+        added = []
+        if new_ports:
+            found = discover_serial_devices(
+                self.device, self.timeout, ports=new_ports, exclude=self.in_use
+            )
+            added = sorted(info.port for info in found if info.port not in self.devices)
+            # Second attempt only for ports appearing for the first time
+            self._retry = new_ports - self._retry - set(added)
+            self.devices |= set(added)
+        else:
+            self._retry = set()
+        return added, removed
 
 
 class SerialConnection(serial.Serial):
@@ -65,21 +673,68 @@ class SerialConnection(serial.Serial):
     """
 
     BUFFER_WAITTIME: float = 0.01  # duration to allow buffer to populate, in seconds
+    LOCK_TIMEOUT: float = 2.0  # maximum wait for device access, in seconds
+    READER_POLL: float = 0.05  # maximum wait of the background reader, in seconds
 
-    def __init__(self, device_path: str, timeout: float = 0.1):
+    def __init__(
+        self,
+        device_path: str,
+        timeout: float = 0.1,
+        blocking_wait: bool = True,
+        fast_cleanup: bool = True,
+        timeout_policy: Optional[AdaptiveTimeoutPolicy] = None,
+        background_reader: bool = False,
+        event_callback: Optional[Callable[[str], None]] = None,
+        event_filter: Optional[Callable[[str], bool]] = None,
+        exclusive: Optional[bool] = None,
+    ):
         """Initializes the connection to the USB device.
 
         Args:
             device_path: The full path to the serial_device.
             timeout: Device timeout.
+            blocking_wait: Sleep in the OS while waiting for a response,
+                instead of polling `in_waiting` in a busy loop.
+            fast_cleanup: Skip the buffer settle delay in `cleanup()` when
+                the buffers are already empty, unless a read timed out.
+            timeout_policy: Read timeouts learned per command, used unless a
+                timeout is passed explicitly. May be shared between connections.
+            background_reader: Read replies from a background thread, see
+                `start_reader()`.
+            event_callback: See `start_reader()`.
+            event_filter: See `start_reader()`.
+            exclusive: Lock the port for exclusive access (POSIX only), see
+                `serial.Serial`.
         Raises:
             serial.SerialException:
                 Port does not exist, no access permissions or attempted
                 read/write on unopened port.
         """
-        super().__init__(device_path, timeout=timeout)
+        self.blocking_wait = blocking_wait
+        self.fast_cleanup = fast_cleanup
+        self.timeout_policy = timeout_policy
+        self.cleanup_counts = {"fast": 0, "slow": 0}  # calls per cleanup path
+        self._local = threading.local()  # see `reply_suspect`, `_measurement`
+        self._dirty = False  # a reply may still be in transit, see `cleanup()`
+        self._after_timeout = False  # previous read timed out
+        self._settled = True  # no write since the last read, see `cleanup()`
+        self._lock = threading.RLock()
+        self._records: Optional[Deque[CommandRecord]] = None
+        self._dump_stop: Optional[threading.Event] = None
+        self._reader: Optional[threading.Thread] = None
+        self._reader_stop = threading.Event()
+        self._pending: Deque[_PendingRequest] = collections.deque()
+        self._pending_lock = threading.Lock()
+        self._output_lock = threading.Lock()  # see `write_urgent()`
+        self._resync = False  # late replies may arrive, see `request()`
+        self._late_reply = False  # a request timed out since the last resync
+        self._quiet_since = 0.0  # monotonic time of the latest line or timeout
+        super().__init__(device_path, timeout=timeout, exclusive=exclusive)
         self.cleanup()
+        if background_reader:
+            self.start_reader(event_callback, event_filter)
 
+    @synchronized
     def cleanup(self):
         """Cleans up the device to prepare for IO.
 
@@ -87,19 +742,460 @@ class SerialConnection(serial.Serial):
         checks until buffers are empty or read timeout of device is reached
         (0.1 seconds if not specified).
 
+        If `fast_cleanup` is set, the buffers are checked before waiting, and
+        the method returns immediately if they are already empty, unless a
+        command was written without reading its reply, e.g. by `writeline()`,
+        since the device may still reply with an error message. The number
+        of calls returning early and calls going through the settle loop are
+        counted in `cleanup_counts` under "fast" and "slow" respectively.
+
+        After a read timed out, the reply may still be in transit. Incoming
+        data is then discarded until the device stays quiet for the device
+        timeout, so that the late reply is not read as the reply to the next
+        command.
+
         Raises:
             serial.SerialException: Attempted to access a closed port.
+        Note:
+            Does nothing while the background reader runs, which receives all
+            device output instead, see `start_reader()`.
         """
+        if self._reader is not None:
+            return
+        if (
+            self.fast_cleanup
+            and self._settled
+            and not (self._dirty or self.in_waiting or self.out_waiting)
+        ):
+            self.cleanup_counts["fast"] += 1
+            return
+        self.cleanup_counts["slow"] += 1
+
         timeout = 0.1 if self.timeout is None else self.timeout
+        if self._dirty:
+            # Drain until quiet, bounded in case the device keeps sending
+            drain_end = time.time() + self.LOCK_TIMEOUT
+            while time.time() < drain_end:
+                if not self._read_available(min(timeout, drain_end - time.time())):
+                    break
+            self._dirty = False
         end_time = time.time() + timeout
         while True:
             time.sleep(SerialConnection.BUFFER_WAITTIME)
             if not (self.in_waiting or self.out_waiting):
                 break
             self.reset_input_buffer()
-            self.reset_output_buffer()
+            with self._output_lock:
+                self.reset_output_buffer()
             if time.time() > end_time:
                 break
+        self._settled = True
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """Device read timeout in seconds, see `serial.Serial.timeout`.
+
+        Unaffected by the temporary port timeout of `_read_available()`, which
+        the background reader sets while other threads send requests.
+        """
+        return self._device_timeout
+
+    @timeout.setter
+    def timeout(self, timeout: Optional[float]) -> None:
+        serial.serialutil.SerialBase.timeout.fset(self, timeout)
+        self._device_timeout = timeout
+
+    @property
+    def _measurement(self) -> Optional[_Measurement]:
+        """Command recorded by the calling thread, see `instrumented()`."""
+        return getattr(self._local, "measurement", None)
+
+    @_measurement.setter
+    def _measurement(self, measurement: Optional[_Measurement]) -> None:
+        self._local.measurement = measurement
+
+    @property
+    def reply_suspect(self) -> bool:
+        """Last reply read by the calling thread may answer an earlier command.
+
+        Set if a read timed out before, since its reply may still have been
+        in transit, e.g. for replies to be validated against their command.
+        """
+        return getattr(self._local, "reply_suspect", False)
+
+    @contextlib.contextmanager
+    def reserve(self, timeout: Optional[float] = None):
+        """Reserves the device for the calling thread.
+
+        All IO methods acquire the device, so that a command and its reply
+        are never interleaved with those of other threads. Hold this context
+        to also run a sequence of commands without interruption, e.g. a
+        read-modify-write. Reentrant.
+
+        Args:
+            timeout: Maximum wait for the device in seconds, defaults to
+                `LOCK_TIMEOUT`.
+        Raises:
+            serial.SerialTimeoutException: Device still busy after timeout.
+
+        Examples:
+            >>> with connection.reserve():
+            ...     power = int(connection.getresponse("POWER?"))
+            ...     connection.writeline(f"POWER {power | 0b01}")
+        """
+        if timeout is None:
+            timeout = self.LOCK_TIMEOUT
+        if not self._lock.acquire(timeout=timeout):
+            raise serial.SerialTimeoutException("Device busy, access timed out")
+        try:
+            yield self
+        finally:
+            self._lock.release()
+
+    def enable_instrumentation(
+        self,
+        maxlen: int = 1000,
+        dump_interval: Optional[float] = None,
+        dump: Optional[Callable[[Dict[str, Dict[str, float]]], None]] = None,
+    ) -> None:
+        """Starts recording the timing of commands, see `CommandRecord`.
+
+        Records are kept in a ring buffer holding the most recent commands.
+        When disabled, the only overhead is a check per IO call.
+
+        Args:
+            maxlen: Number of most recent commands kept.
+            dump_interval: Period in seconds for passing the summary to `dump`,
+                not dumped if None.
+            dump: Called with `instrumentation_summary()`, logs it by default.
+        """
+        self.disable_instrumentation()
+        self._records = collections.deque(maxlen=maxlen)
+        if dump_interval is not None:
+            stop = self._dump_stop = threading.Event()
+            if dump is None:
+                dump = functools.partial(logger.info, "%s: %s", self.portstr)
+
+            def run():
+                while not stop.wait(dump_interval):
+                    dump(self.instrumentation_summary())
+
+            thread = threading.Thread(target=run, name="InstrumentationDump")
+            thread.daemon = True
+            thread.start()
+
+    def disable_instrumentation(self) -> None:
+        """Stops recording, and discards the records."""
+        self._records = None
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_stop = None
+
+    @property
+    def instrumentation_records(self) -> List[CommandRecord]:
+        """Recorded commands, oldest first. Empty if not enabled."""
+        return list(self._records or ())
+
+    def instrumentation_summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns statistics of the recorded commands, keyed by `command_mnemonic()`.
+
+        Durations are in milliseconds, byte counts are totals.
+        """
+        groups: Dict[str, List[CommandRecord]] = collections.defaultdict(list)
+        for record in self.instrumentation_records:
+            groups[command_mnemonic(record.command)].append(record)
+
+        summary = {}
+        for mnemonic, records in groups.items():
+            durations = sorted(record.duration for record in records)
+            first_bytes = [r.first_byte for r in records if r.first_byte is not None]
+            summary[mnemonic] = {
+                "count": len(records),
+                "timeouts": sum(record.timed_out for record in records),
+                "mean_ms": 1e3 * statistics.fmean(durations),
+                "p50_ms": 1e3 * statistics.median(durations),
+                "p95_ms": 1e3 * durations[int(0.95 * (len(durations) - 1))],
+                "max_ms": 1e3 * durations[-1],
+                "first_byte_ms": (
+                    1e3 * statistics.median(first_bytes) if first_bytes else None
+                ),
+                "bytes_out": sum(record.bytes_out for record in records),
+                "bytes_in": sum(record.bytes_in for record in records),
+            }
+        return summary
+
+    def read(self, size: int = 1) -> bytes:
+        data = super().read(size)
+        if self._measurement is not None:
+            self._count_read(data)
+        return data
+
+    def write(self, data) -> Optional[int]:
+        self._settled = False  # until the reply is read, see `cleanup()`
+        self._quiet_since = time.monotonic()  # see `_wait_quiet()`
+        written = super().write(data)
+        if self._measurement is not None:
+            self._count_write(len(data) if written is None else written)
+        return written
+
+    def write_urgent(self, data: bytes) -> None:
+        """Writes data without reserving the device, and waits until it is sent.
+
+        Output buffer resets in `cleanup()` by other threads wait meanwhile, so
+        that the data is not discarded before it is transmitted.
+
+        Raises:
+            serial.SerialException: Attempted to access a closed port.
+        """
+        with self._output_lock:
+            self.write(data)
+            self.flush()
+
+    def _count_read(self, data: bytes) -> None:
+        """Updates the command being recorded, see `instrumented()`."""
+        if data:
+            if self._measurement.first_byte is None:
+                self._measurement.first_byte = time.perf_counter()
+            self._measurement.bytes_in += len(data)
+
+    def _count_write(self, size: int) -> None:
+        """Updates the command being recorded, see `instrumented()`."""
+        self._measurement.write_end = time.perf_counter()
+        self._measurement.bytes_out += size
+
+    def start_reader(
+        self,
+        event_callback: Optional[Callable[[str], None]] = None,
+        event_filter: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        """Starts reading all device output from a background thread.
+
+        Reply lines are matched in order to the commands sent with `request()`,
+        which `getresponse()`, `getresponses()` and `getlines()` then use, so
+        that several requests can be in flight at once. The input buffer is no
+        longer flushed before each command, and lines not matching any request,
+        e.g. error messages after a `writeline()`, are passed to
+        `event_callback` instead of being discarded.
+
+        A request timing out before all its lines are received completes with
+        the lines received so far, and no longer takes any lines. Since its
+        remaining lines may still arrive, requests already in flight are marked
+        as suspect, see `reply_suspect`, and the next request is only sent once
+        the device has been quiet for the device timeout. Lines received
+        meanwhile are passed to `event_callback`. The next request is marked
+        as suspect too, as in plain mode, and if it receives a reply, the
+        request after it waits for the device to be quiet again. Similarly,
+        a request following a `writeline()` waits for the device to be quiet
+        for `BUFFER_WAITTIME`, so that error messages are not taken as its
+        reply.
+
+        Args:
+            event_callback: Called from the reader thread with each unmatched
+                line. Unmatched lines are logged if None.
+            event_filter: Returns True for lines which are never replies,
+                e.g. error messages, so that they are passed to
+                `event_callback` even while requests are pending.
+        """
+        if self._reader is not None:
+            return
+        self._event_callback = event_callback or functools.partial(
+            logger.warning, "Unsolicited reply from %s: %s", self.portstr
+        )
+        self._event_filter = event_filter
+        self._reader_stop.clear()
+        self._reader = threading.Thread(
+            target=self._read_lines, name="SerialReader", daemon=True
+        )
+        self._reader.start()
+
+    def stop_reader(self) -> None:
+        """Stops the background reader, failing all pending requests."""
+        reader = self._reader
+        if reader is None:
+            return
+        self._reader_stop.set()
+        if reader is not threading.current_thread():
+            reader.join()
+        self._reader = None
+
+    def request(
+        self, cmd: str, count: Optional[int] = 1, timeout: Optional[float] = None
+    ) -> Future:
+        """Sends command, returning a future holding its reply lines.
+
+        Requires the background reader, see `start_reader()`.
+
+        Args:
+            cmd: Command to send. No newline is necessary.
+            count: Number of lines expected. If None, the reply is complete
+                once no line was received for `BUFFER_WAITTIME` seconds.
+            timeout: Optional timeout override in seconds, with the same
+                precedence as in `getresponse()`.
+        Returns:
+            Future resolving to the reply lines, stripped of line endings.
+            Fewer lines than expected are returned if the timeout is reached.
+        Raises:
+            serial.SerialException: Background reader not running.
+        """
+        return self._send_request(cmd, count, timeout).future
+
+    def _send_request(
+        self, cmd: str, count: Optional[int], timeout: Optional[float]
+    ) -> _PendingRequest:
+        """Sends command as in `request()`, returning the pending request."""
+        timeout = self._response_timeout(cmd, timeout)
+        with self.reserve():
+            if self._reader is None:
+                raise serial.SerialException("Background reader not running")
+            suspect = self._late_reply  # late replies may outlast the wait
+            if self._resync:
+                self._wait_quiet(0.1 if self.timeout is None else self.timeout)
+            elif not self._settled:
+                # Error messages following a `writeline()`, see `cleanup()`
+                self._wait_quiet(SerialConnection.BUFFER_WAITTIME)
+            self._resync = self._late_reply = False
+            pending = _PendingRequest(cmd, count, Future(), timeout)
+            pending.suspect = suspect
+            pending.measurement = self._measurement
+            with self._pending_lock:
+                self._pending.append(pending)
+            try:
+                self.writeline(cmd)
+            except Exception:
+                with self._pending_lock:
+                    self._pending.remove(pending)
+                raise
+            self._settled = True  # the reply is matched to the request
+        return pending
+
+    def _wait_quiet(self, quiet: float) -> None:
+        """Waits for late replies, see `start_reader()`.
+
+        Returns once no request is pending and the device was quiet for
+        'quiet' seconds, bounded by `LOCK_TIMEOUT` in case it keeps sending.
+        """
+        end_time = time.monotonic() + self.LOCK_TIMEOUT
+        while time.monotonic() < end_time and self._reader is not None:
+            with self._pending_lock:
+                idle = not self._pending
+                idle = idle and time.monotonic() - self._quiet_since >= quiet
+            if idle:
+                break
+            time.sleep(SerialConnection.BUFFER_WAITTIME)
+
+    def _request_lines(
+        self, cmd: str, count: Optional[int], timeout: Optional[float]
+    ) -> List[str]:
+        """Sends a request and waits for its reply lines, see `request()`.
+
+        Also sets `reply_suspect` for the calling thread.
+        """
+        pending = self._send_request(cmd, count, timeout)
+        lines = pending.future.result()
+        self._local.reply_suspect = pending.suspect
+        return lines
+
+    def _read_lines(self) -> None:
+        """Runs the background reader, see `start_reader()`."""
+        buffer = bytearray()
+        error: Exception = serial.SerialException("Background reader stopped")
+        try:
+            while not self._reader_stop.is_set():
+                buffer.extend(self._read_available(self._reader_wait()))
+                *lines, rest = buffer.split(b"\n")
+                buffer = bytearray(rest)
+                for line in lines:
+                    text = line.decode(errors="replace").strip("\r\n")
+                    self._dispatch(text, len(line) + 1)
+                self._expire()
+        except (serial.SerialException, OSError, TypeError, ValueError) as e:
+            error = serial.SerialException(f"Background reader failed: {e}")
+        finally:
+            self._reader = None
+            with self._pending_lock:
+                pending, self._pending = list(self._pending), collections.deque()
+            for request in pending:
+                if not request.future.done():
+                    request.future.set_exception(error)
+
+    def _reader_wait(self) -> float:
+        """Returns the time until the oldest pending request needs attention."""
+        wait = self.READER_POLL
+        with self._pending_lock:
+            if self._pending:
+                request = self._pending[0]
+                now = time.monotonic()
+                wait = min(wait, request.deadline - now)
+                if request.count is None and request.lines:
+                    wait = min(wait, request.last_line + self.BUFFER_WAITTIME - now)
+        return max(wait, 0.0)
+
+    def _dispatch(self, line: str, size: int = 0) -> None:
+        """Passes a received line of 'size' bytes to the oldest pending request."""
+        completed = None
+        with self._pending_lock:
+            self._quiet_since = time.monotonic()
+            request = self._pending[0] if self._pending else None
+            if self._event_filter is not None and self._event_filter(line):
+                request = None
+            if request is not None:
+                if request.measurement is not None:
+                    if request.measurement.first_byte is None:
+                        request.measurement.first_byte = time.perf_counter()
+                    request.measurement.bytes_in += size
+                request.lines.append(line)
+                request.last_line = self._quiet_since
+                if request.count is not None and len(request.lines) >= request.count:
+                    completed = self._pending.popleft()
+        if completed is not None:
+            self._complete(completed, timed_out=False)
+        elif request is None:
+            try:
+                self._event_callback(line)
+            except Exception:
+                logger.exception("Event callback failed")
+
+    def _expire(self) -> None:
+        """Completes timed out and open-ended requests."""
+        now = time.monotonic()
+        completed = []
+        with self._pending_lock:
+            while self._pending:
+                request = self._pending[0]
+                if (
+                    request.count is None
+                    and request.lines
+                    and now - request.last_line >= self.BUFFER_WAITTIME
+                ):
+                    timed_out = False
+                elif now >= request.deadline:
+                    timed_out = request.count is not None or not request.lines
+                else:
+                    break
+                self._pending.popleft()
+                completed.append((request, timed_out))
+                if timed_out:
+                    # Late replies would be taken by the following requests
+                    self._resync = self._late_reply = True
+                    self._quiet_since = now
+                    for later in self._pending:
+                        later.suspect = True
+        for request, timed_out in completed:
+            self._complete(request, timed_out)
+
+    def _complete(self, request: _PendingRequest, timed_out: bool) -> None:
+        if request.suspect and not timed_out:
+            # Its own reply may still be in transit, see `_observe()`
+            with self._pending_lock:
+                self._resync = True
+                self._quiet_since = time.monotonic()
+        self._observe(request.cmd, request.start, timed_out)
+        if request.future.set_running_or_notify_cancel():
+            request.future.set_result(list(request.lines))
+
+    def close(self) -> None:
+        self.stop_reader()
+        super().close()
 
     @classmethod
     def connect_by_name(cls, device: str):
@@ -122,6 +1218,8 @@ class SerialConnection(serial.Serial):
             )
         return SerialConnection(ports[0])
 
+    @_synchronized_read
+    @instrumented
     def getresponses(self, cmd: str, timeout: Optional[float] = None) -> List[str]:
         """Sends command and reads the device response.
 
@@ -133,8 +1231,10 @@ class SerialConnection(serial.Serial):
         communication timeout. The timeout for the response uses the following
         values in order of precedence:
             1. timeout, if specified
-            2. SerialConnection.timeout, if not None
-            3. 0.1 seconds
+            2. timeout learned by `timeout_policy` for the command, if any,
+               but no shorter than the default below
+            3. SerialConnection.timeout, if not None
+            4. 0.1 seconds
 
         Args:
             cmd: Command to send. No newline is necessary.
@@ -149,13 +1249,31 @@ class SerialConnection(serial.Serial):
             additional read timeout override. To consider refactoring to
             `readlines()` + read timeout adjustment instead.
         """
+        if self._reader is not None:
+            return self._request_lines(cmd, None, timeout)
         self.cleanup()
         self.writeline(cmd)
 
         # Wait until characters are available, or until timeout reached
-        if timeout is None:
-            timeout = 0.1 if self.timeout is None else self.timeout
-        end_time = time.time() + timeout
+        timeout = self._response_timeout(cmd, timeout)
+        start = time.time()
+        end_time = start + timeout
+        if self.blocking_wait:
+            # Keep reading until the device goes quiet for BUFFER_WAITTIME
+            replies = bytearray(self._read_available(timeout))
+            while replies:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    break
+                chunk = self._read_available(
+                    min(remaining, SerialConnection.BUFFER_WAITTIME)
+                )
+                if not chunk:
+                    break
+                replies.extend(chunk)
+            self._observe(cmd, start, timed_out=not replies)
+            return [line.strip("\r\n") for line in replies.decode().split("\n")]
+
         while not self.in_waiting:
             if time.time() > end_time:
                 break
@@ -171,8 +1289,11 @@ class SerialConnection(serial.Serial):
                 break
             time.sleep(SerialConnection.BUFFER_WAITTIME)
 
+        self._observe(cmd, start, timed_out=not replies)
         return [line.strip("\r\n") for line in replies.decode().split("\n")]
 
+    @_synchronized_read
+    @instrumented
     def getresponse(self, cmd: str, timeout: Optional[float] = None) -> str:
         """Sends command and reads a single-line device response.
 
@@ -184,8 +1305,10 @@ class SerialConnection(serial.Serial):
         communication timeout. The timeout for the response uses the following
         values in order of precedence:
             1. timeout, if specified
-            2. SerialConnection.timeout, if not None
-            3. 0.1 seconds
+            2. timeout learned by `timeout_policy` for the command, if any,
+               but no shorter than the default below
+            3. SerialConnection.timeout, if not None
+            4. 0.1 seconds
 
         Args:
             cmd: Command to send. No newline is necessary.
@@ -195,13 +1318,28 @@ class SerialConnection(serial.Serial):
         Raises:
             serial.SerialException: Attempted to access a closed port.
         """
+        if self._reader is not None:
+            lines = self._request_lines(cmd, 1, timeout)
+            return lines[0] if lines else ""
         self.cleanup()
         self.writeline(cmd)
 
         # Wait until characters are available, or until timeout reached
-        if timeout is None:
-            timeout = 0.1 if self.timeout is None else self.timeout
-        end_time = time.time() + timeout
+        timeout = self._response_timeout(cmd, timeout)
+        start = time.time()
+        end_time = start + timeout
+        if self.blocking_wait:
+            # Return as soon as the line terminator arrives
+            reply = bytearray()
+            while b"\n" not in reply:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    break
+                reply.extend(self._read_available(remaining))
+            self._observe(cmd, start, timed_out=b"\n" not in reply)
+            reply = reply.split(b"\n", 1)[0]
+            return reply.decode().strip("\r\n")
+
         while not self.in_waiting:
             if time.time() > end_time:
                 break
@@ -216,8 +1354,132 @@ class SerialConnection(serial.Serial):
                 break
             time.sleep(SerialConnection.BUFFER_WAITTIME)
 
+        self._observe(cmd, start, timed_out=not reply.endswith(b"\n"))
         return reply.decode().strip("\r\n")
 
+    @_synchronized_read
+    @instrumented
+    def getlines(
+        self, cmd: str, count: int, timeout: Optional[float] = None
+    ) -> List[str]:
+        """Sends command and reads a fixed number of device response lines.
+
+        Intended for chained queries, e.g. "HTEMP?;PTEMP?" which returns two
+        lines. Returns as soon as `count` lines have been received, otherwise
+        the lines received until the timeout is reached. The timeout applies to
+        the whole reply, with the same precedence as in `getresponse()`.
+
+        Args:
+            cmd: Command to send. No newline is necessary.
+            count: Number of lines expected.
+            timeout: Optional timeout override in seconds. Defaults to None.
+        Returns:
+            Lines of the device reply, stripped of leading/trailing whitespace.
+        Raises:
+            serial.SerialException: Attempted to access a closed port.
+        """
+        if self._reader is not None:
+            return self._request_lines(cmd, count, timeout)
+        self.cleanup()
+        self.writeline(cmd)
+
+        timeout = self._response_timeout(cmd, timeout)
+        start = time.time()
+        end_time = start + timeout
+        reply = bytearray()
+        while reply.count(b"\n") < count:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                break
+            reply.extend(self._read_available(remaining))
+        self._observe(cmd, start, timed_out=reply.count(b"\n") < count)
+
+        lines = reply.decode().split("\n")[:count]
+        if lines and not lines[-1]:
+            lines.pop()  # no partial trailing line
+        return [line.strip("\r\n") for line in lines]
+
+    def _response_timeout(self, cmd: str, timeout: Optional[float]) -> float:
+        """Returns the read timeout for 'cmd', see `getresponse()`.
+
+        Learned timeouts only extend the default timeout: a reply arriving
+        just after a shorter timeout would be lost, even though `cleanup()`
+        discards it, and a hiccup of a few ms would fail the read.
+        """
+        if timeout is not None:
+            return timeout
+        default = 0.1 if self.timeout is None else self.timeout
+        if self.timeout_policy is not None:
+            return self.timeout_policy.timeout(cmd, default, minimum=default)
+        return default
+
+    def _observe(self, cmd: str, start: float, timed_out: bool) -> None:
+        """Reports the response time since 'start' to the timeout policy.
+
+        Also marks the connection for draining after a timed out read, and
+        the next reply as suspect, see `reply_suspect`. A suspect reply may be
+        the late reply to the earlier command, in which case the reply to this
+        command is still in transit, so the connection is drained again.
+        """
+        suspect = self._after_timeout
+        self._local.reply_suspect = suspect
+        self._after_timeout = timed_out
+        self._dirty = self._dirty or timed_out or suspect
+        self._settled = True
+        if self.timeout_policy is not None:
+            self.timeout_policy.observe(cmd, time.time() - start, timed_out)
+
+    def _read_available(self, timeout: float) -> bytes:
+        """Blocks until data is available, and returns all buffered bytes.
+
+        The wait is performed with `select()` on the port file descriptor where
+        supported (POSIX), otherwise with the pyserial read timeout, so that no
+        CPU time is spent while the device is idle.
+
+        Args:
+            timeout: Maximum wait duration in seconds.
+        Returns:
+            Bytes read, empty if timeout is reached without any data.
+        Raises:
+            serial.SerialException: Attempted to access a closed port.
+        """
+        if not self.in_waiting:
+            if timeout <= 0:
+                return b""
+            fileno = self._select_fileno()
+            if fileno is not None:
+                readable, _, _ = select.select([fileno], [], [], timeout)
+                if not readable:
+                    return b""
+                # Read at least one byte, so that a disconnect raises
+                return self.read(max(1, self.in_waiting))
+            else:
+                # Single byte blocking read with a temporary port timeout,
+                # leaving `timeout` unchanged for other threads
+                port_timeout = serial.serialutil.SerialBase.timeout
+                port_timeout.fset(self, timeout)
+                try:
+                    data = self.read(1)
+                finally:
+                    port_timeout.fset(self, self._device_timeout)
+                return data + self.read(self.in_waiting)
+        return self.read(self.in_waiting)
+
+    def _select_fileno(self) -> Optional[int]:
+        """Returns the port file descriptor if it supports `select()`.
+
+        `Serial.fileno()` is inherited from `io.RawIOBase` on all platforms,
+        but only returns a selectable descriptor on POSIX.
+        """
+        if os.name != "posix":
+            return None
+        try:
+            return self.fileno()
+        except (AttributeError, io.UnsupportedOperation, OSError):
+            return None
+
+    @synchronized
+    @instrumented
     def writeline(self, cmd: str) -> None:
         """Sends command to device.
 
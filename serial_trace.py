@@ -0,0 +1,269 @@
+"""Recording and replay of the serial traffic of S-Fifteen instruments devices.
+
+`RecordingSerialConnection` captures every write to and every chunk read from
+the device, with monotonic timestamps, into a compact binary trace file.
+`ReplaySerialConnection` plays a trace back in place of the device, either
+with the original timing or as fast as possible, so that parsing and GUI
+update paths can be reproduced and profiled without hardware.
+
+Trace format:
+    The header is `TRACE_MAGIC` followed by the wall clock time at the start
+    of the recording, as a little-endian double. Each event is a `RECORD`
+    struct (kind, seconds since start, payload length) followed by the payload.
+
+Examples:
+    >>> com = RecordingSerialConnection("/dev/ttyACM0", "session.trace")
+    >>> device = SPDCDriver.from_connection(com)
+    ...
+    >>> com = ReplaySerialConnection("session.trace", speed=None)
+    >>> device = SPDCDriver.from_connection(com)
+"""
+
+import struct
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import serial
+
+from serial_connection import SerialConnection
+
+TRACE_MAGIC = b"S15TRACE\x01"
+HEADER = struct.Struct("<d")  # wall clock time at start of recording
+RECORD = struct.Struct("<BdI")  # kind, seconds since start, payload length
+
+WRITE, READ = 0, 1  # kinds of trace events
+
+
+class TraceEvent(NamedTuple):
+    kind: int  # WRITE or READ
+    time: float  # seconds since start of recording
+    data: bytes
+
+
+class TraceMismatchError(serial.SerialException):
+    """Replayed writes differ from the recorded ones."""
+
+
+def read_trace(path: str) -> Tuple[float, List[TraceEvent]]:
+    """Returns the start time and events of a trace file.
+
+    Raises:
+        ValueError: Not a trace file, or truncated.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    if not content.startswith(TRACE_MAGIC):
+        raise ValueError(f"'{path}' is not a trace file")
+    offset = len(TRACE_MAGIC)
+    (start,) = HEADER.unpack_from(content, offset)
+    offset += HEADER.size
+
+    events = []
+    while offset < len(content):
+        if offset + RECORD.size > len(content):
+            raise ValueError(f"Trace file '{path}' is truncated")
+        kind, timestamp, length = RECORD.unpack_from(content, offset)
+        offset += RECORD.size
+        data = content[offset : offset + length]
+        if len(data) < length:
+            raise ValueError(f"Trace file '{path}' is truncated")
+        events.append(TraceEvent(kind, timestamp, data))
+        offset += length
+    return start, events
+
+
+class RecordingSerialConnection(SerialConnection):
+    """Serial connection recording all traffic into a trace file.
+
+    Events are flushed to the file as they occur, so that the trace is kept
+    if the program crashes. Bytes discarded by buffer resets during
+    `cleanup()` are never read, and are not recorded.
+    """
+
+    def __init__(self, device_path: str, trace_path: str, **kwargs):
+        """Opens the device and starts recording.
+
+        Args:
+            device_path: The full path to the serial device.
+            trace_path: Trace file, overwritten if present.
+            kwargs: See `SerialConnection`.
+        """
+        self._trace = open(trace_path, "wb")
+        self._trace.write(TRACE_MAGIC + HEADER.pack(time.time()))
+        self._trace_start = time.monotonic()
+        self._trace_lock = threading.Lock()
+        super().__init__(device_path, **kwargs)
+
+    def _record(self, kind: int, data: bytes) -> None:
+        with self._trace_lock:
+            if self._trace.closed:
+                return
+            timestamp = time.monotonic() - self._trace_start
+            self._trace.write(RECORD.pack(kind, timestamp, len(data)) + data)
+            self._trace.flush()
+
+    def read(self, size: int = 1) -> bytes:
+        data = super().read(size)
+        if data:
+            self._record(READ, data)
+        return data
+
+    def write(self, data) -> Optional[int]:
+        written = super().write(data)
+        self._record(WRITE, bytes(data))
+        return written
+
+    def close(self) -> None:
+        super().close()
+        with self._trace_lock:
+            self._trace.close()
+
+
+class ReplaySerialConnection(SerialConnection):
+    """Serial connection replaying a trace, in place of the device.
+
+    Writes are matched against the recorded writes in order. The recorded
+    replies following a write become readable after their recorded delay,
+    scaled by `speed`, or immediately if `speed` is None. Read timeouts of the
+    recording still take their full duration, as the reading code waits for
+    further data until its deadline.
+    """
+
+    def __init__(
+        self,
+        trace_path: str,
+        speed: Optional[float] = 1.0,
+        strict: bool = True,
+        **kwargs,
+    ):
+        """Loads the trace.
+
+        Args:
+            trace_path: Trace file, see `RecordingSerialConnection`.
+            speed: Replay speed relative to the recording, e.g. 2.0 for twice
+                as fast. Replies are available immediately if None.
+            strict: Raise `TraceMismatchError` if a write differs from the
+                recording, instead of replaying the recorded replies anyway.
+            kwargs: See `SerialConnection`.
+        """
+        self.trace_path = trace_path
+        self.speed = speed
+        self.strict = strict
+        self.start_time, self._events = read_trace(trace_path)
+        self._position = 0  # index of next event
+        self._write_time = time.monotonic()  # when the last write was replayed
+        self._write_event_time = 0.0  # when the last write was recorded
+        self._buffer = bytearray()  # replies released for reading
+        self._open = False
+        super().__init__(None, **kwargs)  # no port opened
+        self._open = True
+
+    @property
+    def is_open(self) -> bool:
+        return self._open
+
+    @is_open.setter
+    def is_open(self, value: bool) -> None:
+        pass  # set by Serial, the replay is open until closed
+
+    def _reconfigure_port(self, *args, **kwargs) -> None:
+        pass  # no port settings to apply
+
+    @property
+    def finished(self) -> bool:
+        """True if all events of the trace have been replayed."""
+        return self._position >= len(self._events)
+
+    def _due(self, event: TraceEvent) -> float:
+        """Returns the monotonic time from which a recorded reply is readable."""
+        if self.speed is None:
+            return self._write_time
+        delay = (event.time - self._write_event_time) / self.speed
+        return self._write_time + delay
+
+    def _release(self, now: float) -> None:
+        """Moves recorded replies that are due into the read buffer."""
+        while not self.finished:
+            event = self._events[self._position]
+            if event.kind != READ or self._due(event) > now:
+                break
+            self._buffer.extend(event.data)
+            self._position += 1
+
+    def _next_reply_due(self) -> Optional[float]:
+        if self.finished or self._events[self._position].kind != READ:
+            return None  # no further reply before the next write
+        return self._due(self._events[self._position])
+
+    def _wait_for_reply(self, timeout: float) -> None:
+        """Waits up to 'timeout' seconds for a recorded reply to be due."""
+        end_time = time.monotonic() + timeout
+        self._release(time.monotonic())
+        if self._buffer:
+            return
+        due = self._next_reply_due()
+        if due is None or due > end_time:
+            time.sleep(max(0.0, timeout))  # as the device did not reply in time
+        else:
+            time.sleep(max(0.0, due - time.monotonic()))
+        self._release(time.monotonic())
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        if self._measurement is not None:
+            self._count_read(data)
+        return data
+
+    @property
+    def in_waiting(self) -> int:
+        self._release(time.monotonic())
+        return len(self._buffer)
+
+    @property
+    def out_waiting(self) -> int:
+        return 0
+
+    def read(self, size: int = 1) -> bytes:
+        if not self._buffer:
+            self._wait_for_reply(self.timeout or 0.0)
+        return self._take(size)
+
+    def _read_available(self, timeout: float) -> bytes:
+        self._wait_for_reply(timeout)
+        return self._take(len(self._buffer))
+
+    def write(self, data) -> Optional[int]:
+        data = bytes(data)
+        # Replies not read by the replaying code are discarded, see cleanup()
+        while not self.finished and self._events[self._position].kind == READ:
+            self._position += 1
+        if self.finished:
+            raise TraceMismatchError(f"Write {data!r} beyond end of trace")
+
+        event = self._events[self._position]
+        if event.data != data and self.strict:
+            raise TraceMismatchError(
+                f"Write {data!r} differs from recorded write {event.data!r}"
+            )
+        self._position += 1
+        self._write_time = time.monotonic()
+        self._write_event_time = event.time
+        if self._measurement is not None:
+            self._count_write(len(data))
+        return len(data)
+
+    def reset_input_buffer(self) -> None:
+        self._buffer.clear()
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.stop_reader()
+        self._open = False
+        self._buffer.clear()
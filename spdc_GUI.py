@@ -43,12 +43,25 @@ from PyQt5.QtCore import (
         QThread,
         QTimer
         )
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
+import json
+import os
 import time
 from types import NoneType
-
-from spdc_driver_trim import SPDCDriver
-from serial_connection import search_for_serial_devices
+from typing import NamedTuple, Optional
+
+from spdc_driver_trim import DeviceReplyError, DeviceStatus, SPDCDriver
+from spdc_scheduler import CommandScheduler, Priority
+from spdc_broker import is_broker_address, open_device
+from serial_trace import RecordingSerialConnection
+from serial_connection import (
+    AdaptiveTimeoutPolicy,
+    SerialPortMonitor,
+    find_known_device,
+    iter_serial_devices,
+    usb_serial_number,
+    )
 from serial import SerialTimeoutException
 
 """[summary]
@@ -68,6 +81,83 @@ Global_Style = """QPushButton
 
 DEVICE_IDENTIFIER = "SPDC"
 digit_font_size = 41
+HOTPLUG_INTERVAL = 1.0  # seconds between checks for (un)plugged devices
+# Address of a running spdc_broker.py, e.g. tcp://127.0.0.1:8765, listed as device
+BROKER_ADDRESS = os.environ.get('SPDC_BROKER', '')
+# File recording the serial traffic of the connected device, see serial_trace
+TRACE_FILE = os.environ.get('SPDC_TRACE', '')
+DEVICE_PLACEHOLDER = 'Select your device'
+SEARCH_PLACEHOLDER = 'Searching for devices...'
+CPPS_List = ['SPDC driver, svn-05',
+       'S-15 Instruments SPDC source driver, firmware svn-5. Serial: SPDCSDR-10',
+       'S-15 Instruments SPDC source driver, firmware svn-7. Serial: SPDCSDR-99',
+            ]
+# Last successfully connected device, tried first on startup
+LAST_DEVICE_FILE = os.path.join(
+        os.path.expanduser('~'), '.spdc_gui', 'last_device.json')
+# Response times learned in previous sessions, see AdaptiveTimeoutPolicy
+TIMEOUTS_FILE = os.path.join(
+        os.path.expanduser('~'), '.spdc_gui', 'timeouts.json')
+
+
+def load_last_device():
+    """Returns the cached last device as a dict, None if unavailable.
+
+    Keys are 'port', 'serial_number', 'identity' and 'dev_mode'.
+    """
+    try:
+        with open(LAST_DEVICE_FILE) as f:
+            last_device = json.load(f)
+        if last_device.get('port') and last_device.get('identity'):
+            return last_device
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def save_last_device(port: str, serial_number, identity: str, dev_mode: str):
+    """Caches the device on disk, see `load_last_device`."""
+    try:
+        os.makedirs(os.path.dirname(LAST_DEVICE_FILE), exist_ok=True)
+        with open(LAST_DEVICE_FILE, 'w') as f:
+            json.dump({'port': port,
+                       'serial_number': serial_number,
+                       'identity': identity,
+                       'dev_mode': dev_mode,
+                       }, f)
+    except OSError as e:
+        print(f'Unable to cache device: {e}')
+
+
+def load_timeout_policy() -> AdaptiveTimeoutPolicy:
+    """Returns the timeout policy learned in previous sessions, if any."""
+    try:
+        return AdaptiveTimeoutPolicy(TIMEOUTS_FILE)
+    except (OSError, ValueError) as e:
+        print(f'Unable to load learned timeouts: {e}')
+        policy = AdaptiveTimeoutPolicy()
+        policy.path = TIMEOUTS_FILE
+        return policy
+
+
+def get_devmode(identity: str) -> str:
+    """Returns the device mode, 'CPPS' or 'EPPS', from the device identity."""
+    if identity in CPPS_List:
+        return 'CPPS'
+    return 'EPPS'
+
+
+class DeviceState(NamedTuple):
+    """Connected device with its initial state, see `DeviceConnector`."""
+    device: SPDCDriver
+    path: str
+    identity: str
+    dev_mode: str
+    serial_number: Optional[str]
+    status: DeviceStatus
+    laser_current_limit: float
+    laser_current: float
+
 
 class UpdateGUI(QObject):
     # Worker Signals
@@ -79,19 +169,18 @@ class UpdateGUI(QObject):
     def __init__(self):
         super(UpdateGUI, self).__init__()
         self.active_flag = False
-        self.unblocked = True
         self.runtime = 0
 
     # Connected to MainWindow enableDev.
     @pyqtSlot(object, str)
-    def run(self,dev_handle: object, dev_mode: str):
+    def run(self,scheduler: object, dev_mode: str):
         data = {}
         self.active_flag = True
         start = time.time()
         while self.active_flag == True:
             time.sleep(2)
             olddata = data
-            data = self.get_data(dev_handle, dev_mode)
+            data = self.get_data(scheduler, dev_mode)
             if isinstance(data,NoneType):
                 data = olddata
             now = time.time()
@@ -100,30 +189,149 @@ class UpdateGUI(QObject):
                 break
         print('Terminating update')
 
-    def get_data(self, dev_handle, dev_mode):
-        """Read data from device
+    def get_data(self, scheduler, dev_mode):
+        """Read data from device, at the lowest priority
         """
         try:
-            while self.unblocked:
-                self.unblocked = False
-                l_current = dev_handle.laser_current
-                p_temp = dev_handle.peltier_temp
-                p_voltage = dev_handle.peltier_voltage
-                p_constp = dev_handle.pconstp
-                p_consti = dev_handle.pconsti
-                power = dev_handle.power
-                status = dev_handle.status
-                self.unblocked = True
-                return {'lcurrent' : l_current,
-                    'ptemp'    : p_temp,
-                    'pvolt'    : p_voltage,
-                    'pconstp'  : p_constp,
-                    'pconsti'  : p_consti,
-                    'power'    : power,
-                    'status'   : status,
-                    }
-        except SerialTimeoutException:
+            # All queries chained into a single round trip
+            return scheduler.call(
+                    lambda dev: dev.snapshot(), Priority.TELEMETRY)
+        except (SerialTimeoutException, FutureTimeoutError):
             pass
+        except DeviceReplyError as e:
+            print(f'Invalid telemetry: {e}')
+        except OSError as e:
+            # SerialException, or ConnectionError of a broker gone away
+            print(f'Unable to read telemetry: {e}')
+        except RuntimeError:
+            pass  # device closed, see CommandScheduler.close
+
+
+class DeviceScanner(QObject):
+    """Worker searching for SPDC devices, reporting each as soon as found.
+
+    The last used device is checked first, so that it can be reconnected
+    without waiting for the full scan, which then lists the other devices.
+    """
+    # Worker Signals
+    device_found = pyqtSignal(str)
+    last_device_found = pyqtSignal(str)
+    scan_finished = pyqtSignal()
+
+    def __init__(self):
+        super(DeviceScanner, self).__init__()
+        # Ports never probed, set by MainWindow.set_port_in_use
+        self.in_use = set()
+
+    # Connected to MainWindow scan_requested.
+    @pyqtSlot()
+    def run(self):
+        last_port = None
+        last_device = load_last_device()
+        if last_device is not None:
+            last_port = find_known_device(
+                    last_device['identity'],
+                    last_device['port'],
+                    last_device.get('serial_number'))
+        found = []
+        if last_port is not None:
+            self.last_device_found.emit(last_port)
+            found.append(last_port)
+        try:
+            # Do twice cause ATMEL chips may ignore query when first plugged in
+            for _ in range(2):
+                for port in iter_serial_devices(
+                        DEVICE_IDENTIFIER, exclude=found + list(self.in_use)):
+                    self.device_found.emit(port)
+                    found.append(port)
+        except Exception as e:
+            print(f'Device search failed: {e}')
+        self.scan_finished.emit()
+
+
+class DeviceConnector(QObject):
+    """Worker opening a device and reading its initial state.
+
+    The result is delivered as a single `DeviceState` in `device_connected`.
+    """
+    # Worker Signals
+    device_connected = pyqtSignal('PyQt_PyObject')
+    connection_failed = pyqtSignal(str, str)
+
+    def __init__(self, timeout_policy: AdaptiveTimeoutPolicy):
+        super(DeviceConnector, self).__init__()
+        self.timeout_policy = timeout_policy
+
+    # Connected to MainWindow connect_requested.
+    @pyqtSlot(str)
+    def connect_device(self, devPath: str):
+        print('Creating SPDC object.')
+        try:
+            if TRACE_FILE and not is_broker_address(devPath):
+                device = SPDCDriver.from_connection(
+                        RecordingSerialConnection(
+                            devPath, TRACE_FILE,
+                            timeout_policy=self.timeout_policy))
+            else:
+                # Serial port or broker address
+                device = open_device(
+                        devPath, timeout_policy=self.timeout_policy)
+        except OSError as e:  # also ConnectionError, e.g. broker gone away
+            self.connection_failed.emit(devPath, str(e))
+            return
+        try:
+            identity = device.identity
+            status, llimit, lcurrent = device.query_many(
+                    ['STATUS?', 'LLIMIT?', 'LCURRENT?'])
+            state = DeviceState(
+                    device=device,
+                    path=devPath,
+                    identity=identity,
+                    dev_mode=get_devmode(identity),
+                    serial_number=usb_serial_number(devPath),
+                    status=DeviceStatus.from_register(status),
+                    laser_current_limit=llimit,
+                    laser_current=lcurrent,
+                    )
+        except (OSError, ValueError) as e:
+            device.close()
+            self.connection_failed.emit(devPath, str(e))
+            return
+        self.device_connected.emit(state)
+
+
+class HotplugMonitor(QObject):
+    """Worker watching for SPDC devices being plugged in or removed.
+
+    Only newly appeared ports are probed, see `SerialPortMonitor`.
+    """
+    # Worker Signals
+    device_added = pyqtSignal(str)
+    device_removed = pyqtSignal(str)
+
+    def __init__(self, known_devices, in_use):
+        super(HotplugMonitor, self).__init__()
+        self.active_flag = False
+        self.monitor = SerialPortMonitor(
+                DEVICE_IDENTIFIER, known_devices=known_devices)
+        self.monitor.in_use = in_use
+
+    # Connected to MainWindow hotplug_requested.
+    @pyqtSlot()
+    def run(self):
+        self.active_flag = True
+        while self.active_flag:
+            try:
+                added, removed = self.monitor.poll()
+            except Exception as e:
+                print(f'Hotplug check failed: {e}')
+                added, removed = [], []
+            for port in removed:
+                self.device_removed.emit(port)
+            for port in added:
+                self.device_added.emit(port)
+            time.sleep(HOTPLUG_INTERVAL)
+        print('Terminating hotplug monitor')
 
 
 class MainWindow(QMainWindow):
@@ -135,6 +343,13 @@ class MainWindow(QMainWindow):
 
     # Signal for updating GUI. device_handle and dev_mode passed
     update_requested = pyqtSignal(object, str)
+    # Signals for starting device discovery and the hotplug monitor
+    scan_requested = pyqtSignal()
+    hotplug_requested = pyqtSignal()
+    # Signal for opening a device, device path passed
+    connect_requested = pyqtSignal(str)
+    # Signal for the laser state after a switch command, see toggle_laser
+    laser_switched = pyqtSignal(bool)
 
     def __init__(self, *args, **kwargs):
         """[summary]
@@ -147,9 +362,18 @@ class MainWindow(QMainWindow):
         self._open_ports = []
         self.digit_font_size = digit_font_size
         self._dev_selected = False
+        self._laser_on = False
+        self._laser_switches = 0  # clicks of the laser button, see toggle_laser
+        self._laser_current = None  # from the latest telemetry, in mA
+        self._scheduler = None  # runs all device commands, see CommandScheduler
+        self._timeout_policy = load_timeout_policy()
         self.dev_list = []
 
         self.initUI() # UI is initialised afer the class variables are defined
+        if BROKER_ADDRESS:
+            self.devCombobox.addItem(BROKER_ADDRESS)
+        self.start_device_connector()
+        self.start_device_scan()
 
         #self._dev_path_prev = self.devCombobox.currentText()
         #self._dev_mode_prev = self.modesCombobox.currentText()
@@ -180,6 +404,7 @@ class MainWindow(QMainWindow):
 
         self.laserButton = QPushButton("Laser", self)
         self.laserButton.clicked.connect(self.toggle_laser)
+        self.laser_switched.connect(self.show_laser_state)
         self.laserButton.setStyleSheet("background-color: grey")
         self.laserButton.setEnabled(False)
 
@@ -208,18 +433,9 @@ class MainWindow(QMainWindow):
 
 
         #---------Interactive Fields---------#
-        try:
-            # Do twice cause ATMEL chips may ignore query when first plugged in
-            self.dev_list = search_for_serial_devices(
-                    DEVICE_IDENTIFIER)
-            self.dev_list = search_for_serial_devices(
-                    DEVICE_IDENTIFIER)
-        except:
-            pass
-
+        # Devices are added as they are found, see start_device_scan
         self.devCombobox = QComboBox(self)
-        self.devCombobox.addItem('Select your device')
-        self.devCombobox.addItems(self.dev_list)
+        self.devCombobox.addItem(DEVICE_PLACEHOLDER)
         self.devCombobox.currentTextChanged.connect(self.selectDevice)
 
         self.lcurr = QDoubleSpinBox(self)
@@ -294,51 +510,189 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.mainwidget)
         #--------Layout--------#
 
+    def start_device_scan(self):
+        """
+        Start searching for devices via QThread, followed by the hotplug monitor.
+        """
+        self.set_combobox_placeholder(SEARCH_PLACEHOLDER)
+        self.scanner = DeviceScanner()
+        self.discovery_thread = QThread(self)
+        self.scanner.moveToThread(self.discovery_thread)
+        self.discovery_thread.start()
+
+        self.scan_requested.connect(self.scanner.run)
+        self.scanner.device_found.connect(self.add_device)
+        self.scanner.last_device_found.connect(self.reconnect_last_device)
+        self.scanner.scan_finished.connect(self.start_hotplug_monitor)
+        self.scan_requested.emit()
+
+    def start_device_connector(self):
+        """
+        Start the worker opening selected devices via QThread.
+        """
+        self.connector = DeviceConnector(self._timeout_policy)
+        self.connector_thread = QThread(self)
+        self.connector.moveToThread(self.connector_thread)
+        self.connector_thread.start()
+
+        self.connect_requested.connect(self.connector.connect_device)
+        self.connector.device_connected.connect(self.device_connected)
+        self.connector.connection_failed.connect(self.connection_failed)
+
+    def set_combobox_placeholder(self, text: str):
+        # Avoid triggering selectDevice when the placeholder is selected
+        self.devCombobox.blockSignals(True)
+        self.devCombobox.setItemText(0, text)
+        self.devCombobox.blockSignals(False)
+
+    # Connected to scanner last_device_found signal
+    @pyqtSlot(str)
+    def reconnect_last_device(self, devPath: str):
+        self.add_device(devPath)
+        if not self._dev_selected:
+            print(f'Reconnecting to last device at {devPath}')
+            self.devCombobox.setCurrentText(devPath)
+
+    # Connected to scanner scan_finished signal
+    @pyqtSlot()
+    def start_hotplug_monitor(self):
+        """
+        Start watching for devices being (un)plugged, in the discovery thread.
+        """
+        self.set_combobox_placeholder(DEVICE_PLACEHOLDER)
+        self.hotplug = HotplugMonitor(self.dev_list, self.scanner.in_use)
+        self.hotplug.moveToThread(self.discovery_thread)
+
+        self.hotplug_requested.connect(self.hotplug.run)
+        self.hotplug.device_added.connect(self.add_device)
+        self.hotplug.device_removed.connect(self.remove_device)
+        self.hotplug_requested.emit()
+
+    def set_port_in_use(self, devPath: str):
+        """
+        Exclude the port of the selected device from discovery probes, which
+        would otherwise interleave with its traffic.
+        """
+        in_use = {devPath} if devPath else set()
+        self.scanner.in_use = in_use
+        try:
+            self.hotplug.monitor.in_use = in_use
+        except AttributeError:
+            pass  # device search still running
+
+    # Connected to hotplug device_added signal
+    @pyqtSlot(str)
+    def add_device(self, devPath: str):
+        if self.devCombobox.findText(devPath) < 0:
+            print(f'Device found at {devPath}')
+            self.devCombobox.addItem(devPath)
+            self.dev_list.append(devPath)
+
+    # Connected to hotplug device_removed signal
+    @pyqtSlot(str)
+    def remove_device(self, devPath: str):
+        index = self.devCombobox.findText(devPath)
+        if index < 0:
+            return
+        print(f'Device removed from {devPath}')
+        if index == self.devCombobox.currentIndex():
+            self.devCombobox.setCurrentIndex(0)  # disconnects device
+        self.devCombobox.removeItem(index)
+        self.dev_list.remove(devPath)
+
+    def closeEvent(self, event):
+        try:
+            self.hotplug.active_flag = False
+        except AttributeError:
+            pass  # device search still running
+        self.discovery_thread.quit()
+        self.discovery_thread.wait(int(2000 * HOTPLUG_INTERVAL))
+        self.connector_thread.quit()
+        self.connector_thread.wait()
+        try:
+            self._timeout_policy.save()
+        except OSError as e:
+            print(f'Unable to save learned timeouts: {e}')
+        super(MainWindow, self).closeEvent(event)
+
+    def submit_command(self, command, priority: Priority, name: str):
+        """
+        Queue a device command without waiting, see CommandScheduler.
+        """
+        def report(future):
+            if future.exception() is not None:
+                print(f"Unable to {name}: {future.exception()}")
+        self._scheduler.submit(command, priority).add_done_callback(report)
+
     def toggle_power(self):
         """
         """
-        read_out = False
-        while not read_out:
-            print("Toggle power function called")
-            if self.logger.unblocked:
-                status = self._spdc_dev.status
-                other_power = (status&256)>>8
-                if other_power == 0:
-                    self._spdc_dev.peltier_loop_on()
-                    if self._dev_mode == 'EPPS':
-                        self._spdc_dev.heater_loop_on()
-                    print("Power on")
-                else:
-                    self._spdc_dev.peltier_loop_off()
-                    self._spdc_dev.heater_loop_off()
-                    print("Power off")
-                read_out = True
+        print("Toggle power function called")
+        dev_mode = self._dev_mode
+
+        def toggle(dev):
+            if not dev.decoded_status.heater_peltier_power:
+                dev.peltier_loop_on()
+                if dev_mode == 'EPPS':
+                    dev.heater_loop_on()
+                print("Power on")
+            else:
+                dev.peltier_loop_off()
+                dev.heater_loop_off()
+                print("Power off")
+        self.submit_command(toggle, Priority.USER, "toggle power")
 
     def toggle_laser(self):
         """
         """
-        read_out = False
-        while not read_out:
-            print("Toggle laser function called")
-            if self.logger.unblocked:
-                #self.logger.unblocked = False
-                status = self._spdc_dev.status
-                laser_power = (status&512)>>9
-                laser_on = (status&4)>>2
-                if laser_on == 0 and laser_power == 0:
-                    curr = self.lcurr.value()
-                    self._spdc_dev.laser_off()
-                    self._spdc_dev.laser_on(curr)
-                    time.sleep(0.02)
-                    print("Laser on")
-                elif laser_power ==1 and laser_on == 1:
-                    curr = self._spdc_dev.laser_current
-                    self._spdc_dev.laser_off()
-                    self._spdc_dev.old_laser_current = curr
-                    time.sleep(0.02)
-                    print("Laser off")
-                #self.logger.unblocked = True
-                read_out = True
+        print("Toggle laser function called")
+        # The state is updated right away, so that a second click reverts the
+        # first one even before telemetry shows its effect
+        self._laser_switches += 1
+        switch = self._laser_switches
+        if self._laser_on:
+            self._laser_on = False
+            # Jumps ahead of any queued telemetry poll. The current is taken
+            # from telemetry, so that nothing is queried before switching off
+            curr = self._laser_current
+
+            def switch_off(dev):
+                dev.emergency_off()
+                dev.laser_off()  # also disables the laser power line
+                if curr is not None:
+                    dev.old_laser_current = curr
+                print("Laser off")
+                self.laser_switched.emit(False)
+            self.submit_command(switch_off, Priority.EMERGENCY, "switch off laser")
+            return
+
+        self._laser_on = True
+        curr = self.lcurr.value()
+
+        def switch_on(dev):
+            if switch != self._laser_switches:
+                return  # switched off by a later click
+            status = dev.decoded_status
+            if status.laser_on or status.laser_power:
+                self.laser_switched.emit(status.laser_on and status.laser_power)
+                return
+            dev.laser_off()
+            dev.laser_on(curr)
+            time.sleep(0.02)
+            print("Laser on")
+            self.laser_switched.emit(True)
+        self.submit_command(switch_on, Priority.USER, "switch on laser")
+
+    @pyqtSlot(bool)
+    def show_laser_state(self, laser_on: bool):
+        """Shows whether the laser is on, see laser_switched."""
+        self._laser_on = laser_on
+        if laser_on:
+            self.laserButton.setStyleSheet("background-color: green")
+            self.lcurr.setEnabled(True)
+        else:
+            self.laserButton.setStyleSheet("background-color: red")
+            self.lcurr.setEnabled(False)
 
     @pyqtSlot(float)
     def update_ltemp(self, curr_value: float):
@@ -350,43 +704,65 @@ class MainWindow(QMainWindow):
         """ Empty function
         """
         print("update_lcurr called")
-        self._spdc_dev.laser_current = curr_value
+        def set_current(dev):
+            dev.laser_current = curr_value
+        self.submit_command(set_current, Priority.USER, "set laser current")
 
     # Connected to devComboBox.currentTextChanged
     @pyqtSlot(str)
     def selectDevice(self, devPath: str):
-        if devPath == 'Select your device':
-            if self._dev_selected:
-                self.disableDevOptions()
-                self._spdc_dev.close()
+        if self.devCombobox.currentIndex() == 0:  # placeholder
+            self.disconnect_device()
+            self.set_port_in_use('')
             return
+        self.set_port_in_use(devPath)
         #self.StrongResetInternalVariables()
-        print('Creating SPDC object.')
-        self._spdc_dev = SPDCDriver(devPath)
-        self._dev_path = devPath
-        check = self._spdc_dev._com.portstr
+        # Opened in the connector thread, see device_connected
+        self.connect_requested.emit(devPath)
+
+    # Connected to connector device_connected signal
+    @pyqtSlot('PyQt_PyObject')
+    def device_connected(self, state: DeviceState):
+        if state.path != self.devCombobox.currentText():
+            state.device.close()  # selection changed while connecting
+            return
+        self.disconnect_device()  # previously selected device, if any
+        self._spdc_dev = state.device
+        self._scheduler = CommandScheduler(state.device)
+        self._dev_path = state.path
+        check = state.path
         print(f'Device connected at {check}')
-        self.set_devmode()
-        self.enableDevOptions()
+        self._identity = state.identity
+        self._dev_mode = state.dev_mode
+        print(f'Device is a {self._dev_mode}')
+        self.enableDevOptions(state)
         self._dev_selected = True
+        if not is_broker_address(state.path):
+            save_last_device(state.path, state.serial_number,
+                             state.identity, state.dev_mode)
 
-    def set_devmode(self):
-        CPPS_List = ['SPDC driver, svn-05',
-       'S-15 Instruments SPDC source driver, firmware svn-5. Serial: SPDCSDR-10',
-       'S-15 Instruments SPDC source driver, firmware svn-7. Serial: SPDCSDR-99',
-                ]
-        idn = self._spdc_dev.identity
-        if idn in CPPS_List:
-            self._dev_mode = 'CPPS'
-        else:
-            self._dev_mode = 'EPPS'
-        print(f'Device is a {self._dev_mode}')
-        return
+    def disconnect_device(self):
+        """
+        Stop polling, and close the scheduler and the device, if connected.
+        """
+        if not self._dev_selected:
+            return
+        self.disableDevOptions()
+        self._scheduler.close()
+        self._spdc_dev.close()
+        self._dev_selected = False
+
+    # Connected to connector connection_failed signal
+    @pyqtSlot(str, str)
+    def connection_failed(self, devPath: str, error: str):
+        print(f'Unable to connect to device at {devPath}: {error}')
+        if devPath == self.devCombobox.currentText():
+            self.devCombobox.setCurrentIndex(0)
 
     def StrongResetInternalVariables(self):
         #self.deleteWorkerAndThread()
         try:
-            self._spdc_dev._com.close()
+            self._spdc_dev.close()
         except AttributeError:
             print('SPDC object not yet created.')
         finally:
@@ -394,21 +770,25 @@ class MainWindow(QMainWindow):
             self._dev_mode = ''
             self._dev_path = '' # Device path, eg. 'COM4'
 
-    def enableDevOptions(self):
+    def enableDevOptions(self, state: DeviceState):
         self.powerButton.setEnabled(True)
-        if self._spdc_dev.power&1 == 1:
+        if state.status.heater_peltier_power:
             self.powerButton.setStyleSheet("background-color: green")
         else:
             self.powerButton.setStyleSheet("background-color: red")
         self.laserButton.setEnabled(True)
-        if self._spdc_dev.power&2 == 2 and self._spdc_dev.status&4 == 4:
+        self._laser_on = state.status.laser_power and state.status.laser_on
+        if self._laser_on:
             self.laserButton.setStyleSheet("background-color: green")
             self.lcurr.setEnabled(True)
         else:
             self.laserButton.setStyleSheet("background-color: red")
             self.lcurr.setEnabled(False)
-        self.lcurr.setRange(0,self._spdc_dev.laser_current_limit)
-        self.lcurr.setValue(self._spdc_dev.laser_current)
+        self.lcurr.setRange(0,state.laser_current_limit)
+        # Displayed value only, no need to write it back to the device
+        self.lcurr.blockSignals(True)
+        self.lcurr.setValue(state.laser_current)
+        self.lcurr.blockSignals(False)
         self.lsettemp.setValue(20.0) # Default 
         self.lsettemp.setEnabled(True)
         #self.samplesSpinbox.setEnabled(True)
@@ -432,7 +812,7 @@ class MainWindow(QMainWindow):
         self.logger.data_is_logged.connect(self.update_from_thread)
         self.logger.thread_finished.connect(self.closethreads_ports_timers)
         #self.logger.permission_error.connect(self.logfile_permission_error_reset)
-        self.update_requested.emit(self._spdc_dev,self._dev_mode)
+        self.update_requested.emit(self._scheduler,self._dev_mode)
 
     def disableDevOptions(self):
         try:
@@ -460,19 +840,14 @@ class MainWindow(QMainWindow):
         next_time = now-start
         self.ltempLabel.setText(str(data['ptemp']))
         self.currentAct.setText(str(data['lcurrent']))
+        self._laser_current = data['lcurrent']
         self.pvolt.setText(str(data['pvolt']))
-        power = int(data['power'])
-        if power&1 == 1:
+        status = DeviceStatus.from_register(int(data['status']))
+        if status.heater_peltier_power:
             self.powerButton.setStyleSheet("background-color: green")
         else:
             self.powerButton.setStyleSheet("background-color: red")
-        status = int(data['status'])
-        if power&2 == 2 and status&4 == 4:
-            self.laserButton.setStyleSheet("background-color: green")
-            self.lcurr.setEnabled(True)
-        else:
-            self.laserButton.setStyleSheet("background-color: red")
-            self.lcurr.setEnabled(False)
+        self.show_laser_state(status.laser_power and status.laser_on)
         if dev_mode == 'EPPS':
             # Extra heater info for EPPS
             pass
@@ -0,0 +1,247 @@
+"""Benchmarks of the serial transport and driver of SPDC drivers.
+
+Measures the latency percentiles and CPU time of reading each `SPDCDriver`
+property, multi-line replies and buffer cleanup, as well as the throughput of
+telemetry polls. Only queries are sent, so the benchmark is safe to run on a
+device in use. Results are written as JSON, for tracking between releases.
+
+With `--switch-off`, the latency of switching off the laser is measured too,
+for which the laser is repeatedly switched on at a low current. Use only on
+devices where lasing is safe, or with `--simulate`.
+
+Usage:
+    python spdc_benchmark.py /dev/ttyACM0 --output results.json
+    python spdc_benchmark.py --simulate --latency 0.002 --switch-off
+
+With `--simulate`, the benchmark runs against `spdc_simulator.py` in a
+separate process, so that the simulator does not count towards CPU time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import serial
+
+from spdc_driver_trim import SPDCDriver
+
+
+def summarize(wall: List[float], cpu: List[float]) -> Dict[str, float]:
+    """Returns statistics of wall and CPU times, given in seconds, in ms."""
+    percentiles = statistics.quantiles(wall, n=100, method="inclusive")
+    return {
+        "count": len(wall),
+        "mean_ms": 1e3 * statistics.fmean(wall),
+        "p50_ms": 1e3 * statistics.median(wall),
+        "p95_ms": 1e3 * percentiles[94],
+        "p99_ms": 1e3 * percentiles[98],
+        "max_ms": 1e3 * max(wall),
+        "cpu_ms": 1e3 * statistics.fmean(cpu),
+    }
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Times repeated calls of 'function', see `summarize()`."""
+    wall, cpu = [], []
+    for _ in range(repeat):
+        start_cpu, start = time.process_time(), time.perf_counter()
+        function()
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - start_cpu)
+    return summarize(wall, cpu)
+
+
+def readable_properties() -> List[str]:
+    """Returns the names of all `SPDCDriver` properties."""
+    return [
+        name
+        for name, attribute in vars(SPDCDriver).items()
+        if isinstance(attribute, property)
+    ]
+
+
+def benchmark_properties(device: SPDCDriver, repeat: int) -> Dict[str, dict]:
+    return {
+        name: measure(lambda: getattr(device, name), repeat)
+        for name in readable_properties()
+    }
+
+
+def benchmark_cleanup(device: SPDCDriver, repeat: int) -> Dict[str, dict]:
+    """Times cleanup with empty buffers, and with a stale reply to discard."""
+    com = device._com
+    wall, cpu = [], []
+    for _ in range(repeat):
+        com.writeline("STATUS?")
+        time.sleep(0.02)  # until the reply is received, not timed
+        start_cpu, start = time.process_time(), time.perf_counter()
+        com.cleanup()
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - start_cpu)
+    return {"empty": measure(com.cleanup, repeat), "stale": summarize(wall, cpu)}
+
+
+def benchmark_polling(device: SPDCDriver, duration: float) -> dict:
+    """Polls telemetry as the GUI does for 'duration' seconds."""
+    wall, cpu = [], []
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        start_cpu, start = time.process_time(), time.perf_counter()
+        device.snapshot()
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - start_cpu)
+    result = summarize(wall, cpu)
+    result["polls_per_second"] = len(wall) / sum(wall)
+    result["cpu_ms_per_query"] = result["cpu_ms"] / len(SPDCDriver.SNAPSHOT_QUERIES)
+    return result
+
+
+def benchmark_switch_off(
+    device: SPDCDriver, repeat: int, current: float = 1.0
+) -> Dict[str, dict]:
+    """Times switching off the laser, switched on at 'current' before each run.
+
+    Calls return once the switch-off command is written. "emergency_busy"
+    times `emergency_off()` while another thread holds the device, as during
+    a long telemetry transaction.
+    """
+
+    def timed(switch_off: Callable[[], object], busy: bool = False):
+        wall, cpu = [], []
+        for _ in range(repeat):
+            device.laser_on(current)  # not timed
+            held, release = threading.Event(), threading.Event()
+            if busy:
+
+                def hold():
+                    with device.reserve():
+                        held.set()
+                        release.wait()
+
+                holder = threading.Thread(target=hold)
+                holder.start()
+                held.wait()
+            start_cpu, start = time.process_time(), time.perf_counter()
+            switch_off()
+            wall.append(time.perf_counter() - start)
+            cpu.append(time.process_time() - start_cpu)
+            if busy:
+                release.set()
+                holder.join()
+            device.laser_off()  # also disables the laser power line
+        return summarize(wall, cpu)
+
+    return {
+        "laser_off": timed(device.laser_off),
+        "emergency_off": timed(device.emergency_off),
+        "emergency_busy": timed(device.emergency_off, busy=True),
+    }
+
+
+def run(
+    device: SPDCDriver,
+    repeat: int = 50,
+    duration: float = 3.0,
+    switch_off: bool = False,
+) -> dict:
+    """Runs all benchmarks, returning the results.
+
+    Laser switch-off is only timed if 'switch_off' is set, see
+    `benchmark_switch_off()`.
+    """
+    com = device._com
+    results = {
+        "properties": benchmark_properties(device, repeat),
+        "getresponse": measure(lambda: com.getresponse("STATUS?"), repeat),
+        "getresponses": measure(lambda: com.getresponses("HELP"), repeat),
+        "query_many": measure(
+            lambda: device.query_many(list(SPDCDriver.SNAPSHOT_QUERIES.values())),
+            repeat,
+        ),
+        "cleanup": benchmark_cleanup(device, repeat),
+        "polling": benchmark_polling(device, duration),
+        "cleanup_counts": dict(com.cleanup_counts),
+    }
+    if switch_off:
+        results["switch_off"] = benchmark_switch_off(device, repeat)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the serial transport of SPDC drivers."
+    )
+    parser.add_argument(
+        "device", nargs="?", default="", help="device path, searched for if omitted"
+    )
+    parser.add_argument(
+        "--simulate", action="store_true", help="benchmark against the simulator"
+    )
+    parser.add_argument(
+        "--mode", choices=["CPPS", "EPPS"], default="CPPS", help="simulated device"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.002, help="simulated reply delay in s"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=50, help="samples per measurement"
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=3.0, help="polling duration in s"
+    )
+    parser.add_argument(
+        "--switch-off",
+        action="store_true",
+        help="also time laser switch-off, switching the laser on between runs",
+    )
+    parser.add_argument("-o", "--output", help="write JSON to file instead of stdout")
+    args = parser.parse_args(argv)
+
+    simulator = None
+    path = args.device
+    if args.simulate:
+        script = os.path.join(os.path.dirname(__file__), "spdc_simulator.py")
+        simulator = subprocess.Popen(
+            [sys.executable, script, "--mode", args.mode]
+            + ["--latency", str(args.latency)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        path = simulator.stdout.readline().strip()
+
+    try:
+        device = SPDCDriver(path)
+        results = {
+            "timestamp": time.time(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "pyserial": serial.__version__,
+            "port": device._com.portstr,
+            "identity": device.identity,
+            "simulated_latency": args.latency if args.simulate else None,
+            "repeat": args.repeat,
+            "results": run(device, args.repeat, args.duration, args.switch_off),
+        }
+        device.close()
+    finally:
+        if simulator is not None:
+            simulator.terminate()
+            simulator.wait()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
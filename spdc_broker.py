@@ -0,0 +1,581 @@
+"""Local broker sharing a single SPDC driver between several processes.
+
+Only one process can own a serial port. The broker owns the `SPDCDriver`, and
+serves its properties and methods over a local TCP or Unix socket, so that
+e.g. the GUI and measurement scripts can use the device at the same time.
+
+Requests from all clients are run by a `CommandScheduler`, and each client
+can have several requests in flight. Identical reads requested while one is
+already pending share its result instead of querying the device again.
+
+Only the properties and the methods in `SPDCBroker.ALLOWED_METHODS` are
+served, and `query_many()` only accepts plain queries. Every request must
+carry the token of the broker, as any program reaching the port, including web
+pages sending requests to loopback addresses, could otherwise switch on the
+laser. The token defaults to the `TOKEN_ENV` environment variable, otherwise to
+a token generated in `TOKEN_FILE`, readable only by the user, which local
+clients of the same user read. Connections sending a line which is not a JSON
+request, or a wrong token, are closed.
+
+Protocol:
+    One JSON object per line in each direction. Requests are of the form
+    `{"id": 1, "op": "get", "name": "peltier_temp"}`, with ops "get" and
+    "set" (with "value") for properties, and "call" (with optional "args" and
+    "kwargs") for methods. An optional "priority" names a `Priority`, and
+    "token" holds the token of the broker.
+    Responses are `{"id": 1, "result": 25.0}`, or
+    `{"id": 1, "error": {"type": "ValueError", "message": "..."}}`, and may
+    arrive out of order.
+
+Usage:
+    python spdc_broker.py /dev/ttyACM0 --address tcp://127.0.0.1:8765
+    SPDC_BROKER_TOKEN=secret python spdc_broker.py --address tcp://0.0.0.0:8765
+
+Examples:
+    >>> device = SPDCClient("tcp://127.0.0.1:8765")
+    >>> device.peltier_temp_setpoint = 25
+    >>> data = device.snapshot()
+"""
+
+import argparse
+import functools
+import hmac
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+
+import serial
+
+from spdc_driver_trim import DeviceReplyError, SPDCDriver
+from spdc_scheduler import CommandScheduler, Priority
+
+logger = logging.getLogger("spdc_broker")
+
+DEFAULT_ADDRESS = "tcp://127.0.0.1:8765"
+TOKEN_ENV = "SPDC_BROKER_TOKEN"  # default token of brokers and clients
+# Token generated for brokers of the user, used if TOKEN_ENV is not set
+TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".spdc_gui", "broker_token")
+
+
+def is_broker_address(address: str) -> bool:
+    """Returns True if 'address' refers to a broker instead of a serial port."""
+    return address.startswith(("tcp://", "unix://"))
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """Returns the socket family and address of a broker address.
+
+    Args:
+        address: Either "tcp://host:port" or "unix:///path/to/socket".
+    Raises:
+        ValueError: Address is malformed, or Unix sockets are not supported,
+            e.g. on Windows.
+    """
+    if address.startswith("unix://"):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError(f"Unix sockets are not supported here: '{address}'")
+        return socket.AF_UNIX, address[len("unix://") :]
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://") :].rpartition(":")
+        if host and port.isdigit():
+            return socket.AF_INET, (host, int(port))
+    raise ValueError(f"Invalid broker address '{address}'")
+
+
+def read_token(path: str = TOKEN_FILE) -> Optional[str]:
+    """Returns the token in `TOKEN_ENV`, otherwise in 'path' if readable."""
+    token = os.environ.get(TOKEN_ENV)
+    if token:
+        return token
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def create_token(path: str = TOKEN_FILE) -> str:
+    """Returns the token of `read_token()`, generating it in 'path' if missing.
+
+    The file is created readable only by the user.
+
+    Raises:
+        OSError: File cannot be written.
+    """
+    token = read_token(path)
+    if token:
+        return token
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    token = secrets.token_hex(16)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token
+
+
+def open_device(path: str, **kwargs) -> Union[SPDCDriver, "SPDCClient"]:
+    """Opens the device at a serial port or broker address, see `SPDCDriver`."""
+    if is_broker_address(path):
+        return SPDCClient(path)
+    return SPDCDriver(path, **kwargs)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    """Serves requests of a single client connection.
+
+    Responses are sent from a separate thread, so that neither the device
+    worker nor the reading of further requests waits on a slow client. The
+    connection is closed on the first line which is not a JSON request, or
+    which carries a wrong token, e.g. from a web page posting to the port.
+    """
+
+    def handle(self) -> None:
+        responses: queue.SimpleQueue = queue.SimpleQueue()
+        writer = threading.Thread(target=self._send, args=(responses,), daemon=True)
+        writer.start()
+        try:
+            for line in self.rfile:
+                self.server.broker.handle_line(line, responses.put)
+        except (PermissionError, ValueError) as e:
+            logger.warning("Closing connection from %s: %s", self.client_address, e)
+        except OSError:
+            pass  # client disconnected
+        finally:
+            responses.put(None)
+
+    def _send(self, responses: queue.SimpleQueue) -> None:
+        while True:
+            response = responses.get()
+            if response is None:
+                return
+            try:
+                self.wfile.write(response)
+            except OSError:
+                return
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class SPDCBroker:
+    """Serves an `SPDCDriver` to local clients, see module documentation."""
+
+    # Read-only methods whose concurrent identical requests are coalesced
+    COALESCED_METHODS = {"snapshot", "query_many", "read_config", "help"}
+
+    # Methods available remotely, in addition to properties. Excludes e.g.
+    # `reset()`, `save_settings()` and context managers.
+    ALLOWED_METHODS = {
+        "apply_config",
+        "emergency_off",
+        "heater_loop_off",
+        "heater_loop_on",
+        "help",
+        "laser_off",
+        "laser_on",
+        "peltier_loop_off",
+        "peltier_loop_on",
+        "query_many",
+        "read_config",
+        "refresh_limits",
+        "snapshot",
+    }
+
+    # Queries accepted by `query_many()`, e.g. "PTEMP?" or "*IDN?", so that it
+    # cannot be used to send arbitrary commands
+    QUERY_PATTERN = re.compile(r"\*?[A-Z]+\?")
+
+    DEFAULT_PRIORITIES = {"emergency_off": Priority.EMERGENCY}
+
+    def __init__(
+        self,
+        device: SPDCDriver,
+        address: str = DEFAULT_ADDRESS,
+        token: Optional[str] = None,
+    ):
+        """Starts serving the device.
+
+        Args:
+            device: Device to share.
+            address: Address to listen on, see `parse_address()`.
+            token: Secret required in every request, defaults to
+                `create_token()`.
+        Raises:
+            ValueError: Address is malformed.
+            OSError: Token file cannot be written.
+        """
+        family, bind_address = parse_address(address)
+        self.device = device
+        self.address = address
+        self.token = token or create_token()
+        self.scheduler = CommandScheduler(device)
+        self.stats = {"requests": 0, "coalesced": 0}
+        self._inflight: Dict[Hashable, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        if family == socket.AF_UNIX:
+            if os.path.exists(bind_address):
+                os.unlink(bind_address)  # stale socket of a previous broker
+            self._server = _UnixServer(bind_address, _BrokerHandler)
+        else:
+            self._server = _TCPServer(bind_address, _BrokerHandler)
+        self._server.broker = self
+
+    def serve_forever(self) -> None:
+        """Serves clients until `shutdown()` is called from another thread."""
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stops serving, once pending requests are done. Does not close device."""
+        self._server.shutdown()
+        self._server.server_close()
+        self.scheduler.close()
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.unlink(bind_address)
+
+    def submit(self, request: Dict[str, Any]) -> Future:
+        """Queues a decoded request, returning a future holding its result.
+
+        Raises:
+            PermissionError: Token missing or wrong.
+            AttributeError: Unknown or unavailable property or method.
+            KeyError: Unknown priority.
+            ValueError: Unknown op, or query_many() with other than queries.
+        """
+        if not hmac.compare_digest(str(request.get("token", "")), self.token):
+            raise PermissionError("Invalid broker token")
+        op, name = request.get("op"), request.get("name", "")
+        if op not in ("get", "set", "call"):
+            raise ValueError(f"Unknown op '{op}'")
+        attribute = getattr(SPDCDriver, name, None)
+        if op in ("get", "set") and not isinstance(attribute, property):
+            raise AttributeError(f"Unknown property '{name}'")
+        if op == "call" and name not in self.ALLOWED_METHODS:
+            raise AttributeError(f"'{name}' is not available remotely")
+
+        default = self.DEFAULT_PRIORITIES.get(name, Priority.USER)
+        priority = Priority[request["priority"]] if "priority" in request else default
+        args, kwargs = request.get("args", []), request.get("kwargs", {})
+        if name == "query_many":
+            self._check_queries(*args, **kwargs)
+        key: Optional[Hashable] = None  # identifies coalesced reads
+        if op == "get":
+            key = (priority, op, name)
+
+            def command(dev):
+                return getattr(dev, name)
+
+        elif op == "set":
+            value = request["value"]
+
+            def command(dev):
+                setattr(dev, name, value)
+
+        else:
+            if name in self.COALESCED_METHODS:
+                key = (priority, op, name, json.dumps([args, kwargs], sort_keys=True))
+
+            def command(dev):
+                return getattr(dev, name)(*args, **kwargs)
+
+        with self._inflight_lock:
+            self.stats["requests"] += 1
+            if key is None:
+                # Reads already pending may have been queued before this write
+                self._inflight.clear()
+                return self.scheduler.submit(command, priority)
+            future = self._inflight.get(key)
+            if future is not None and not future.done():
+                self.stats["coalesced"] += 1
+                return future
+            future = self.scheduler.submit(command, priority)
+            self._inflight[key] = future
+        future.add_done_callback(functools.partial(self._forget, key))
+        return future
+
+    def _check_queries(self, queries, *args, **kwargs) -> None:
+        """Raises ValueError unless all 'queries' are plain queries."""
+        if not isinstance(queries, list) or not all(
+            isinstance(query, str)
+            and self.QUERY_PATTERN.fullmatch(query.strip().upper())
+            for query in queries
+        ):
+            raise ValueError("query_many() only accepts queries, e.g. 'PTEMP?'")
+
+    def _forget(self, key: Hashable, future: Future) -> None:
+        with self._inflight_lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def handle_line(self, line: bytes, reply) -> None:
+        """Submits an encoded request, calling `reply` with the encoded response.
+
+        Raises:
+            ValueError: Line is not a JSON request, see `_BrokerHandler`.
+            PermissionError: Token missing or wrong.
+        """
+        request = json.loads(line)  # json.JSONDecodeError is a ValueError
+        if not isinstance(request, dict):
+            raise ValueError("Request is not a JSON object")
+        request_id = request.get("id")
+        try:
+            future = self.submit(request)
+        except PermissionError as e:
+            reply(self._encode(request_id, error=e))
+            raise
+        except Exception as e:
+            reply(self._encode(request_id, error=e))
+            return
+
+        def respond(future: Future) -> None:
+            try:
+                response = self._encode(request_id, result=future.result())
+            except Exception as e:
+                response = self._encode(request_id, error=e)
+            reply(response)
+
+        future.add_done_callback(respond)
+
+    @staticmethod
+    def _encode(request_id, result: Any = None, error: Optional[Exception] = None):
+        response: Dict[str, Any] = {"id": request_id}
+        if error is None:
+            response["result"] = result
+        else:
+            response["error"] = {"type": type(error).__name__, "message": str(error)}
+        try:
+            return (json.dumps(response) + "\n").encode()
+        except TypeError as e:
+            return SPDCBroker._encode(request_id, error=e)  # result not serializable
+
+
+class SPDCClient:
+    """Proxy to an `SPDCDriver` served by an `SPDCBroker`.
+
+    Properties of `SPDCDriver` and the methods in `SPDCBroker.ALLOWED_METHODS`
+    are available with the same names. The client is thread-safe, and requests
+    from several threads are multiplexed over the single connection.
+    """
+
+    TIMEOUT: float = 10.0  # default wait for each response, in seconds
+
+    # Exceptions re-raised with their original type, others as RuntimeError
+    EXCEPTIONS = {
+        exception.__name__: exception
+        for exception in (
+            AttributeError,
+            KeyError,
+            PermissionError,
+            RuntimeError,
+            TypeError,
+            ValueError,
+            serial.SerialException,
+            serial.SerialTimeoutException,
+            DeviceReplyError,
+        )
+    }
+
+    def __init__(
+        self,
+        address: str = DEFAULT_ADDRESS,
+        timeout: Optional[float] = TIMEOUT,
+        token: Optional[str] = None,
+    ):
+        """Connects to the broker.
+
+        Args:
+            address: Address of the broker, see `parse_address()`.
+            timeout: Duration to wait for each response, in seconds. Waits
+                indefinitely if None.
+            token: Token of the broker, defaults to `read_token()`.
+        Raises:
+            serial.SerialException: Broker not reachable, or address invalid.
+        """
+        try:
+            family, connect_address = parse_address(address)
+        except ValueError as e:
+            raise serial.SerialException(str(e))
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(connect_address)
+        except OSError as e:
+            sock.close()
+            raise serial.SerialException(f"Broker at {address} not reachable: {e}")
+        self._sock = sock
+        self.address = address
+        self.timeout = timeout
+        self._token = token if token is not None else read_token()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._error: Optional[Exception] = None  # set once the connection is lost
+        self._send_lock = threading.Lock()
+        threading.Thread(target=self._receive, daemon=True).start()
+
+    def _receive(self) -> None:
+        error: Exception = ConnectionError("Connection to broker closed")
+        try:
+            for line in self._sock.makefile("rb"):
+                response = json.loads(line)
+                future = self._pending.pop(response.get("id"), None)
+                if future is None:
+                    continue
+                if "error" in response:
+                    exception = self.EXCEPTIONS.get(
+                        response["error"]["type"], RuntimeError
+                    )
+                    future.set_exception(exception(response["error"]["message"]))
+                else:
+                    future.set_result(response["result"])
+        except (OSError, ValueError) as e:
+            error = ConnectionError(f"Connection to broker lost: {e}")
+        with self._pending_lock:
+            self._error = error
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def submit(self, op: str, name: str, priority: Optional[Priority] = None, **fields):
+        """Sends a request, returning a future holding its result.
+
+        Args:
+            op: One of "get", "set" or "call", see `SPDCBroker`.
+            name: Property or method name.
+            priority: Priority class, defaults to that chosen by the broker.
+            fields: Further request fields, e.g. "value" or "args".
+        Raises:
+            ConnectionError: Connection to the broker lost.
+        """
+        request_id = next(self._ids)
+        request = {"id": request_id, "op": op, "name": name, **fields}
+        if priority is not None:
+            request["priority"] = Priority(priority).name
+        if self._token:
+            request["token"] = self._token
+        future: Future = Future()
+        with self._pending_lock:
+            if self._error is not None:
+                raise self._error
+            self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self._sock.sendall((json.dumps(request) + "\n").encode())
+        except OSError as e:
+            self._pending.pop(request_id, None)
+            raise ConnectionError(f"Connection to broker lost: {e}")
+        return future
+
+    def _result(self, future: Future) -> Any:
+        """Waits for the result of a request, for at most `timeout`.
+
+        Raises:
+            serial.SerialTimeoutException: No response within the timeout.
+        """
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError:
+            raise serial.SerialTimeoutException(
+                f"No response from broker within {self.timeout} s"
+            ) from None
+
+    @staticmethod
+    def _convert(function, result: Any) -> Any:
+        """Restores NamedTuple results, e.g. `DeviceStatus`, sent as lists."""
+        cls = getattr(function, "__annotations__", {}).get("return")
+        if isinstance(cls, type) and hasattr(cls, "_fields") and result is not None:
+            return cls(*result)
+        return result
+
+    def call(self, name: str, *args, priority: Optional[Priority] = None, **kwargs):
+        """Calls a device method, see `submit()`."""
+        future = self.submit("call", name, priority, args=list(args), kwargs=kwargs)
+        result = self._result(future)
+        return self._convert(getattr(SPDCDriver, name, None), result)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(SPDCDriver, name, None)
+        if isinstance(attribute, property):
+            result = self._result(self.submit("get", name))
+            return self._convert(attribute.fget, result)
+        if name in SPDCBroker.ALLOWED_METHODS:
+            return functools.partial(self.call, name)
+        raise AttributeError(f"'SPDCClient' object has no attribute '{name}'")
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if not isinstance(getattr(SPDCDriver, name, None), property):
+            object.__setattr__(self, name, value)  # local attribute
+            return
+        self._result(self.submit("set", name, value=value))
+
+    def close(self) -> None:
+        """Closes the connection to the broker, the device stays open."""
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Share an SPDC driver between several local processes."
+    )
+    parser.add_argument(
+        "device", nargs="?", default="", help="device path, searched for if omitted"
+    )
+    parser.add_argument(
+        "-a",
+        "--address",
+        default=DEFAULT_ADDRESS,
+        help=f"tcp://host:port or unix:///path to listen on, {DEFAULT_ADDRESS} "
+        "by default",
+    )
+    parser.add_argument(
+        "--token",
+        default=None,
+        help=f"secret required from clients, defaults to ${TOKEN_ENV}, "
+        f"otherwise to a token generated in {TOKEN_FILE}",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    try:
+        parse_address(args.address)
+        token = args.token or create_token()
+    except (OSError, ValueError) as e:
+        parser.error(str(e))  # before opening the device
+    device = SPDCDriver(args.device)
+    broker = SPDCBroker(device, args.address, token)
+    logger.info("Serving %s at %s", device._com.portstr, args.address)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.shutdown()
+        device.close()
+
+
+if __name__ == "__main__":
+    main()
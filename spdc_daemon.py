@@ -0,0 +1,193 @@
+"""Headless telemetry logger for S-Fifteen Instruments SPDC drivers.
+
+Polls the device telemetry at a fixed rate and writes it to the log and to
+optional CSV / JSON lines files, without the Qt dependencies of the GUI.
+
+Usage:
+    python spdc_daemon.py /dev/ttyACM0 --interval 1 --csv telemetry.csv
+    python spdc_daemon.py --jsonl telemetry.jsonl --query HTEMP? --count 100
+
+The device is searched for if no device path is given. Stop with Ctrl-C or
+SIGTERM.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import signal
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from serial import SerialException
+
+from spdc_driver_trim import SPDCDriver
+
+logger = logging.getLogger("spdc_daemon")
+
+Telemetry = Dict[str, Union[int, float]]
+
+
+class LogSink:
+    """Writes telemetry as a single log line."""
+
+    def write(self, timestamp: float, data: Telemetry) -> None:
+        logger.info(" ".join(f"{key}={value}" for key, value in data.items()))
+
+    def close(self) -> None:
+        pass
+
+
+class CsvSink:
+    """Appends telemetry to a CSV file, with a header for new files."""
+
+    def __init__(self, path: str, fields: List[str]):
+        self._file = open(path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, ["timestamp"] + fields)
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def write(self, timestamp: float, data: Telemetry) -> None:
+        self._writer.writerow({"timestamp": timestamp, **data})
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class JsonLinesSink:
+    """Appends telemetry to a file as one JSON object per line."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a")
+
+    def write(self, timestamp: float, data: Telemetry) -> None:
+        self._file.write(json.dumps({"timestamp": timestamp, **data}) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class TelemetryDaemon:
+    """Polls device telemetry at a fixed rate, and forwards it to sinks.
+
+    Each poll is a single round trip, see `SPDCDriver.query_many()`. Polls are
+    scheduled on a fixed grid, so that slow replies do not accumulate drift.
+    """
+
+    def __init__(
+        self,
+        device: SPDCDriver,
+        sinks: list,
+        interval: float = 2.0,
+        queries: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Args:
+            device: Device to poll.
+            sinks: Objects with `write(timestamp, data)` and `close()` methods.
+            interval: Duration between polls, in seconds.
+            queries: Telemetry queries keyed by field name, defaults to
+                `SPDCDriver.SNAPSHOT_QUERIES`.
+        """
+        self.device = device
+        self.sinks = sinks
+        self.interval = interval
+        if queries is None:
+            queries = SPDCDriver.SNAPSHOT_QUERIES
+        self.queries = dict(queries)
+        self._stop = threading.Event()
+
+    def poll(self) -> Telemetry:
+        values = self.device.query_many(list(self.queries.values()))
+        return dict(zip(self.queries.keys(), values))
+
+    def run(self, count: Optional[int] = None) -> None:
+        """Polls until stopped, or until `count` polls are done."""
+        next_time = time.monotonic()
+        polls = 0
+        while not self._stop.is_set() and (count is None or polls < count):
+            try:
+                data = self.poll()
+            except (SerialException, ValueError) as e:
+                logger.warning("Poll failed: %s", e)
+            else:
+                timestamp = time.time()
+                for sink in self.sinks:
+                    sink.write(timestamp, data)
+            polls += 1
+
+            # Skip missed polls instead of bursting to catch up
+            next_time += self.interval
+            now = time.monotonic()
+            if next_time < now:
+                next_time = now
+            self._stop.wait(next_time - now)
+
+    def stop(self) -> None:
+        """Stops `run()`, can be called from other threads or signal handlers."""
+        self._stop.set()
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "device", nargs="?", default="", help="device path, searched for if omitted"
+    )
+    parser.add_argument(
+        "-i", "--interval", type=float, default=2.0, help="seconds between polls"
+    )
+    parser.add_argument(
+        "-n", "--count", type=int, help="number of polls, unlimited if omitted"
+    )
+    parser.add_argument(
+        "-q",
+        "--query",
+        action="append",
+        default=[],
+        help="additional query to poll, e.g. HTEMP? (repeatable)",
+    )
+    parser.add_argument("--csv", help="append telemetry to CSV file")
+    parser.add_argument("--jsonl", help="append telemetry to JSON lines file")
+    parser.add_argument("--log-file", help="write log to file instead of stderr")
+    parser.add_argument(
+        "--quiet", action="store_true", help="do not log telemetry, only errors"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        filename=args.log_file,
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+
+    queries = dict(SPDCDriver.SNAPSHOT_QUERIES)
+    for query in args.query:
+        queries[query.strip("?").lower()] = query.upper()
+
+    sinks: list = [] if args.quiet else [LogSink()]
+    if args.csv:
+        sinks.append(CsvSink(args.csv, list(queries)))
+    if args.jsonl:
+        sinks.append(JsonLinesSink(args.jsonl))
+
+    device = SPDCDriver(args.device)
+    daemon = TelemetryDaemon(device, sinks, args.interval, queries)
+    signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    logger.info("Polling %s every %s s", device._com.portstr, args.interval)
+    try:
+        daemon.run(args.count)
+    finally:
+        daemon.close()
+        device.close()
+
+
+if __name__ == "__main__":
+    main()
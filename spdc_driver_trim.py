@@ -1,6 +1,48 @@
+import contextlib
+import json
+import threading
 import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
 
-from serial_connection import SerialConnection
+import serial
+
+from serial_connection import AdaptiveTimeoutPolicy, SerialConnection, synchronized
+
+
+class DeviceStatus(NamedTuple):
+    """Decoded status register of the SPDC board, see `SPDCDriver.status`."""
+
+    heater_loop: bool  # bit 0
+    peltier_loop: bool  # bit 1
+    laser_on: bool  # bit 2
+    heater_peltier_power: bool  # bit 8
+    laser_power: bool  # bit 9
+
+    @classmethod
+    def from_register(cls, value: int) -> "DeviceStatus":
+        return cls(
+            heater_loop=bool(value & 0b1),
+            peltier_loop=bool(value & 0b10),
+            laser_on=bool(value & 0b100),
+            heater_peltier_power=bool(value & 0b01_0000_0000),
+            laser_power=bool(value & 0b10_0000_0000),
+        )
+
+    @property
+    def power(self) -> int:
+        """Power converter enable lines, as in `SPDCDriver.power`."""
+        return self.heater_peltier_power | self.laser_power << 1
+
+
+class ConfigResult(NamedTuple):
+    """Outcome of `SPDCDriver.apply_config()`."""
+
+    writes: Dict[str, float]  # registers written, keyed by property name
+    elapsed: float  # duration in seconds, including the read of the config
+
+
+class DeviceReplyError(serial.SerialException):
+    """Device replied with an error message instead of the queried value."""
 
 
 class SPDCDriver(object):
@@ -8,11 +50,275 @@ class SPDCDriver(object):
 
     DEVICE_IDENTIFIER = "SPDCSDR"
 
-    def __init__(self, device_path: str = ""):
+    # Reply types of queries in `query_many()`, replies are floats otherwise
+    QUERY_TYPES = {
+        "*IDN?": str,
+        "HLOOP?": int,
+        "PLOOP?": int,
+        "POWER?": int,
+        "STATUS?": int,
+    }
+
+    # Telemetry polled by the GUI, see `snapshot()`
+    SNAPSHOT_QUERIES = {
+        "lcurrent": "LCURRENT?",
+        "ptemp": "PTEMP?",
+        "pvolt": "PVOLT?",
+        "pconstp": "PCONSTP?",
+        "pconsti": "PCONSTI?",
+        "power": "POWER?",
+        "status": "STATUS?",
+    }
+
+    # Chained command switching off the laser without any query, see
+    # `emergency_off()`. The laser is switched off first, then the current
+    # target is zeroed so that a subsequent `ON` does not restore it.
+    EMERGENCY_OFF_COMMAND = "OFF;LCURRENT 0.000"
+
+    # Registers saved in configuration profiles, keyed by property name, in
+    # order of application so that limits precede the values they bound.
+    # Laser current is excluded, since it is set by `laser_on()`.
+    CONFIG_REGISTERS = {
+        "heater_voltage_limit": "HLIMIT?",
+        "peltier_voltage_limit": "PLIMIT?",
+        "laser_current_limit": "LLIMIT?",
+        "heater_temp_rate": "HRATE?",
+        "heater_temp_setpoint": "HSETTEMP?",
+        "peltier_temp_setpoint": "PSETTEMP?",
+        "hconstp": "HCONSTP?",
+        "hconsti": "HCONSTI?",
+        "hconstd": "HCONSTD?",
+        "pconstp": "PCONSTP?",
+        "pconsti": "PCONSTI?",
+        "pconstd": "PCONSTD?",
+    }
+
+    # Firmware limits used to validate setter values, see `refresh_limits()`
+    LIMIT_QUERIES = ("HLIMIT?", "PLIMIT?", "LLIMIT?")
+
+    # Time-to-live in seconds of cached configuration registers, which only
+    # change when written. Live measurements, e.g. "PTEMP?", are never cached.
+    REGISTER_TTLS: Dict[str, Optional[float]] = {
+        "HSETTEMP?": 30.0,
+        "HRATE?": 30.0,
+        "PSETTEMP?": 30.0,
+        "HCONSTP?": 30.0,
+        "HCONSTI?": 30.0,
+        "HCONSTD?": 30.0,
+        "PCONSTP?": 30.0,
+        "PCONSTI?": 30.0,
+        "PCONSTD?": 30.0,
+    }
+
+    def __init__(
+        self,
+        device_path: str = "",
+        limit_ttl: Optional[float] = None,
+        register_cache: bool = False,
+        timeout_policy: Optional[AdaptiveTimeoutPolicy] = None,
+    ):
+        """Connects to the device.
+
+        Args:
+            device_path: Full path to the device, searched for if not specified.
+            limit_ttl: Duration in seconds after which cached firmware limits
+                are read again from the device. Never expires if None.
+            register_cache: Serve reads of configuration registers from the
+                cache, see `REGISTER_TTLS`.
+            timeout_policy: Read timeouts learned per command, see
+                `SerialConnection`.
+        """
         if device_path == "":
-            self._com = SerialConnection.connect_by_name(self.DEVICE_IDENTIFIER)
+            com = SerialConnection.connect_by_name(self.DEVICE_IDENTIFIER)
         else:
-            self._com = SerialConnection(device_path)
+            com = SerialConnection(device_path)
+        com.timeout_policy = timeout_policy
+        self._setup(com, limit_ttl, register_cache)
+
+    @classmethod
+    def from_connection(
+        cls,
+        connection: SerialConnection,
+        limit_ttl: Optional[float] = None,
+        register_cache: bool = False,
+    ) -> "SPDCDriver":
+        """Creates a driver on an already opened connection.
+
+        Allows using connections other than a plain `SerialConnection`, e.g.
+        to record or replay traces, see `serial_trace`.
+
+        Args:
+            connection: Connection to the device.
+            limit_ttl: See `__init__()`.
+            register_cache: See `__init__()`.
+        """
+        device = cls.__new__(cls)
+        device._setup(connection, limit_ttl, register_cache)
+        return device
+
+    def _setup(
+        self, com: SerialConnection, limit_ttl: Optional[float], register_cache: bool
+    ) -> None:
+        self._com = com
+        self.limit_ttl = limit_ttl
+        self.register_cache = register_cache
+        self.cache_stats = {"hits": 0, "misses": 0}  # reads of cacheable registers
+        self._registers: Dict[str, Tuple[Union[int, float], float]] = {}
+        self._staged: Dict[str, float] = {}  # register writes, see `transaction()`
+        self._staging_thread: Optional[int] = None
+        self._emergencies = 0  # calls of `emergency_off()`, see `laser_on()`
+
+    def refresh_limits(self) -> Dict[str, float]:
+        """Reads all firmware limits in a single round trip, and caches them.
+
+        The cached limits are used by setters for input validation, and are
+        updated whenever the limits are written by this driver. Call this if
+        the limits were changed by another program.
+
+        Returns:
+            Limits keyed by their query, e.g. {"HLIMIT?": 5.0, ...}.
+        """
+        values = self.query_many(list(self.LIMIT_QUERIES))
+        return dict(zip(self.LIMIT_QUERIES, values))
+
+    def clear_cache(self) -> None:
+        """Forgets all cached registers, including firmware limits."""
+        self._registers.clear()
+
+    def _register_ttl(self, query: str) -> Optional[float]:
+        if query in self.LIMIT_QUERIES:
+            return self.limit_ttl
+        return self.REGISTER_TTLS[query]
+
+    def _cached(self, query: str) -> Optional[Union[int, float]]:
+        """Returns the cached register value, None if missing or expired."""
+        entry = self._registers.get(query)
+        if entry is None:
+            return None
+        ttl = self._register_ttl(query)
+        if ttl is not None and time.monotonic() - entry[1] > ttl:
+            return None
+        return entry[0]
+
+    def _store(self, query: str, value: Union[int, float]) -> None:
+        """Caches the register value, if the register is cacheable."""
+        if query in self.LIMIT_QUERIES or query in self.REGISTER_TTLS:
+            self._registers[query] = (value, time.monotonic())
+
+    def _cached_limit(self, query: str) -> float:
+        """Returns the cached firmware limit, refreshing it if missing or stale.
+
+        Limits staged in the current transaction take precedence.
+        """
+        if self._is_staging() and query[:-1] in self._staged:
+            return round(self._staged[query[:-1]], 3)
+        value = self._cached(query)
+        if value is None:
+            value = self.refresh_limits()[query]
+        return value
+
+    def _read(self, query: str) -> Union[int, float]:
+        """Queries a register, typed according to `QUERY_TYPES`.
+
+        Configuration registers are served from the cache if `register_cache`
+        is enabled, with hits and misses counted in `cache_stats`. Replies
+        following a timed out read are not cached, as they may be the late
+        reply to the earlier command, see `SerialConnection.reply_suspect`.
+        """
+        cacheable = self.register_cache and (
+            query in self.LIMIT_QUERIES or query in self.REGISTER_TTLS
+        )
+        if cacheable:
+            value = self._cached(query)
+            if value is not None:
+                self.cache_stats["hits"] += 1
+                return value
+            self.cache_stats["misses"] += 1
+        reply = self._com.getresponse(query)
+        suspect = self._com.reply_suspect
+        value = self._parse_reply(query, reply)
+        if not suspect:
+            self._store(query, value)
+        return value
+
+    def _parse_reply(self, query: str, reply: str) -> Union[int, float, str]:
+        """Types the reply to 'query' according to `QUERY_TYPES`.
+
+        Raises:
+            DeviceReplyError: Reply is not a value, e.g. "Unknown command".
+        """
+        try:
+            return self.QUERY_TYPES.get(query, float)(reply)
+        except ValueError:
+            raise DeviceReplyError(f"Invalid reply to {query}: {reply!r}") from None
+
+    def _write_register(self, register: str, value: float) -> None:
+        """Writes a register value, and updates the cache (write-through).
+
+        Within a transaction, the write is staged instead, see `transaction()`.
+        """
+        if self._is_staging():
+            self._staged[register] = value
+            return
+        self._com.writeline(f"{register} {value:.3f}")
+        self._store(f"{register}?", round(value, 3))
+
+    def _is_staging(self) -> bool:
+        return self._staging_thread == threading.get_ident()
+
+    def _raise_if_staging(self, operation: str) -> None:
+        """Raises RuntimeError within a transaction, see `transaction()`."""
+        if self._is_staging():
+            raise RuntimeError(f"{operation}() cannot be used within a transaction")
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["SPDCDriver"]:
+        """Stages register assignments, and sends them in a single write.
+
+        Assignments to register properties within the context are validated
+        immediately, against the cached firmware limits or limits assigned
+        earlier in the same transaction, but are only sent on exit. The writes
+        are chained into a single command. If `register_cache` is enabled, so
+        that the cache is assumed to reflect the device, writes of values
+        matching unexpired cached values are dropped. Nothing is sent if an
+        exception is raised within the context.
+
+        Only assignments from the calling thread are staged. Queries and other
+        commands, e.g. `power`, are sent immediately. Composite operations,
+        e.g. `laser_on()` or `heater_loop_off()`, raise RuntimeError within the
+        context, since their register assignments would otherwise only be sent
+        on exit, after their other commands.
+
+        Raises:
+            RuntimeError: Transaction already in progress.
+
+        Examples:
+            >>> with driver.transaction():
+            ...     driver.peltier_voltage_limit = 1.5
+            ...     driver.pconstp = 0.8
+            ...     driver.peltier_temp_setpoint = 25
+        """
+        if self._staging_thread is not None:
+            raise RuntimeError("Transaction already in progress")
+        self._staging_thread = threading.get_ident()
+        try:
+            yield self
+            staged = self._staged
+        finally:
+            self._staging_thread = None
+            self._staged = {}
+
+        commands = []
+        for register, value in staged.items():
+            cached = self._cached(f"{register}?") if self.register_cache else None
+            if cached != round(value, 3):
+                commands.append((register, value))
+        if commands:
+            self._com.writeline(
+                ";".join(f"{register} {value:.3f}" for register, value in commands)
+            )
+        for register, value in commands:
+            self._store(f"{register}?", round(value, 3))
 
     @staticmethod
     def _raise_if_oob(value, low, high, propname, propunits):
@@ -27,6 +333,117 @@ class SPDCDriver(object):
                 f"{propname} can only take values between [{low}, {high}] {propunits}"
             )
 
+    def reserve(self, timeout: Optional[float] = None):
+        """Reserves the device for the calling thread.
+
+        Composite operations, e.g. `laser_on()`, reserve the device on their
+        own. Use this to group several operations from other threads, see
+        `SerialConnection.reserve()`.
+
+        Raises:
+            serial.SerialTimeoutException: Device still busy after timeout.
+        """
+        return self._com.reserve(timeout)
+
+    def query_many(
+        self, queries: List[str], timeout: Optional[float] = None
+    ) -> List[Union[int, float, str]]:
+        """Sends several queries in a single write, and parses the replies.
+
+        The queries are chained with ';' so that the whole batch costs a single
+        round trip, instead of one round trip per query.
+
+        Args:
+            queries: Query commands, e.g. ["PTEMP?", "POWER?"].
+            timeout: Optional timeout override for the whole batch, in seconds.
+                Defaults to the timeout learned for the batch by the timeout
+                policy of the connection, if any, otherwise to the device
+                timeout for each query in the batch, since the device replies
+                to chained queries one at a time.
+        Returns:
+            Replies in the same order as `queries`, typed according to
+            `QUERY_TYPES`.
+        Raises:
+            serial.SerialTimeoutException: Fewer replies than queries received.
+            DeviceReplyError: Reply is not a value, e.g. an error message.
+        """
+        cmd = ";".join(queries)
+        if timeout is None:
+            default = len(queries) * (self._com.timeout or 0.1)
+            timeout = self._learned_timeout(cmd, default)
+        replies = self._com.getlines(cmd, len(queries), timeout)
+        suspect = self._com.reply_suspect  # not cached, see `_read()`
+        if len(replies) < len(queries):
+            raise serial.SerialTimeoutException(
+                f"Expected {len(queries)} replies, received {len(replies)}"
+            )
+        values = []
+        for query, reply in zip(queries, replies):
+            query = query.strip().upper()
+            value = self._parse_reply(query, reply)
+            if not (suspect or isinstance(value, str)):
+                self._store(query, value)
+            values.append(value)
+        return values
+
+    def _learned_timeout(self, cmd: str, default: float) -> float:
+        """Returns the timeout learned for 'cmd' by the connection, or 'default'.
+
+        The learned timeout is no shorter than the device timeout, see
+        `SerialConnection.getresponse()`.
+        """
+        if self._com.timeout_policy is None:
+            return default
+        minimum = self._com.timeout or 0.1
+        return self._com.timeout_policy.timeout(cmd, default, minimum=minimum)
+
+    def snapshot(self) -> Dict[str, Union[int, float]]:
+        """Returns the telemetry in `SNAPSHOT_QUERIES`, using a single round trip."""
+        values = self.query_many(list(self.SNAPSHOT_QUERIES.values()))
+        return dict(zip(self.SNAPSHOT_QUERIES.keys(), values))
+
+    def read_config(self) -> Dict[str, float]:
+        """Returns the configuration registers, using a single round trip.
+
+        Returns:
+            Register values keyed by property name, see `CONFIG_REGISTERS`.
+        """
+        values = self.query_many(list(self.CONFIG_REGISTERS.values()))
+        return dict(zip(self.CONFIG_REGISTERS.keys(), values))
+
+    def apply_config(self, config: Dict[str, float]) -> ConfigResult:
+        """Writes only the configuration registers that differ from `config`.
+
+        The current configuration is read in a single round trip, and the
+        differing registers are written in a single transaction, see
+        `transaction()`.
+
+        Args:
+            config: Register values keyed by property name, e.g. as returned
+                by `read_config()` or `load_profile()`. Registers not
+                specified are left unchanged.
+        Returns:
+            Registers written, and the duration of the operation.
+        Raises:
+            ValueError: Unknown register, or value out of bounds.
+        """
+        unknown = set(config) - set(self.CONFIG_REGISTERS)
+        if unknown:
+            raise ValueError(f"Unknown configuration registers: {sorted(unknown)}")
+
+        start = time.monotonic()
+        with self.reserve():
+            current = self.read_config()
+            writes = {
+                name: config[name]
+                for name in self.CONFIG_REGISTERS  # preserve order of application
+                if name in config and round(config[name], 3) != current[name]
+            }
+            with self.transaction():
+                for name, value in writes.items():
+                    setattr(self, name, value)
+        return ConfigResult(writes, time.monotonic() - start)
+
     def help(self) -> str:
         return self._com.get_help()
 
@@ -37,6 +454,7 @@ class SPDCDriver(object):
     def reset(self) -> None:
         """Resets the device."""
         self._com.writeline("*RST")
+        self.clear_cache()  # registers restored from device storage
 
     def save_settings(self) -> str:
         """Save device settings into storage.
@@ -45,9 +463,10 @@ class SPDCDriver(object):
             Success message if save is successful.
         Note:
             Saving of settings typically take longer than 100ms. One second is a
-            reasonable upper bound.
+            reasonable upper bound, used until a timeout is learned by the
+            timeout policy of the connection.
         """
-        return self._com.getresponse("SAVE", timeout=1)
+        return self._com.getresponse("SAVE", timeout=self._learned_timeout("SAVE", 1))
 
     def close(self) -> None:
         """Close connection to device."""
@@ -55,8 +474,9 @@ class SPDCDriver(object):
 
     @property
     def heater_loop(self) -> int:
-        return int(self._com.getresponse("HLOOP?"))
+        return self._read("HLOOP?")
 
+    @synchronized
     def heater_loop_on(self):
         """Switches on the crystal heater temperature PID loop.
 
@@ -65,9 +485,11 @@ class SPDCDriver(object):
             subroutine, since it is usually compounded with the power command.
             See `heater_loop_off()`.
         """
+        self._raise_if_staging("heater_loop_on")
         self._com.writeline("HLOOP 1")
-        self._power_on_heater_peltier()
+        self._power_on_heater_peltier(self.decoded_status)
 
+    @synchronized
     def heater_loop_off(self):
         """Switches off the crystal heater temperature PID loop.
 
@@ -80,40 +502,48 @@ class SPDCDriver(object):
             Implemented because there is likely no use case
             for a voltage hold after PID is switched off, except for debugging.
         """
+        self._raise_if_staging("heater_loop_off")
         self._com.writeline("HLOOP 0")  # holds voltage at current value
         self.heater_voltage = 0
-        if not self.peltier_loop:  # switch off power only if peltier loop also off
-            self._power_off_heater_peltier()
+        status = self.decoded_status
+        if not status.peltier_loop:  # switch off power only if peltier loop also off
+            self._power_off_heater_peltier(status)
 
     @property
     def peltier_loop(self) -> int:
-        return int(self._com.getresponse("PLOOP?"))
+        return self._read("PLOOP?")
 
+    @synchronized
     def peltier_loop_on(self):
         """Switches on the laser peltier temperature PID loop.
 
         Note:
             See `heater_loop_on()`.
         """
+        self._raise_if_staging("peltier_loop_on")
         self._com.writeline("PLOOP 1")
-        self._power_on_heater_peltier()
+        self._power_on_heater_peltier(self.decoded_status)
 
+    @synchronized
     def peltier_loop_off(self):
         """Switches off the laser peltier temperature PID loop.
 
         Note:
             See `peltier_loop_off()`.
         """
+        self._raise_if_staging("peltier_loop_off")
         self._com.writeline("PLOOP 0")  # holds voltage at current value
         self.peltier_voltage = 0
-        if not self.heater_loop:  # switch off power only if heater loop also off
-            self._power_off_heater_peltier()
+        status = self.decoded_status
+        if not status.heater_loop:  # switch off power only if heater loop also off
+            self._power_off_heater_peltier(status)
 
     @property
     def heater_voltage(self) -> float:
-        return float(self._com.getresponse("HVOLT?"))
+        return self._read("HVOLT?")
 
     @heater_voltage.setter
+    @synchronized
     def heater_voltage(self, voltage: float) -> None:
         """Sets voltage across crystal heater, in volts.
 
@@ -139,17 +569,19 @@ class SPDCDriver(object):
 
             At the moment the last option is preferable due to the mix of explicit
             failure and input sanitization. Replacing TypeError with ValueError
-            to minimize the possible exceptions raised.
+            to minimize the possible exceptions raised. The attribute query is
+            avoided by caching the limits, see `refresh_limits()`.
         """
-        hlimit_low, hlimit_high = 0, self.heater_voltage_limit
+        hlimit_low, hlimit_high = 0, self._cached_limit("HLIMIT?")
         self._raise_if_oob(voltage, hlimit_low, hlimit_high, "Heater voltage", "V")
-        self._com.writeline(f"HVOLT {voltage:.3f}")
+        self._write_register("HVOLT", voltage)
 
     @property
     def peltier_voltage(self) -> float:
-        return float(self._com.getresponse("PVOLT?"))
+        return self._read("PVOLT?")
 
     @peltier_voltage.setter
+    @synchronized
     def peltier_voltage(self, voltage: float) -> None:
         """Sets voltage across laser peltier, in volts.
 
@@ -159,13 +591,13 @@ class SPDCDriver(object):
         Raises:
             ValueError: `voltage` is not a valid number.
         """
-        plimit = self.peltier_voltage_limit
+        plimit = self._cached_limit("PLIMIT?")
         self._raise_if_oob(voltage, -plimit, plimit, "Peltier voltage", "V")
-        self._com.writeline(f"PVOLT {voltage:.3f}")
+        self._write_register("PVOLT", voltage)
 
     @property
     def heater_voltage_limit(self) -> float:
-        return float(self._com.getresponse("HLIMIT?"))
+        return self._read("HLIMIT?")
 
     @heater_voltage_limit.setter
     def heater_voltage_limit(self, voltage: float) -> None:
@@ -180,11 +612,11 @@ class SPDCDriver(object):
         self._raise_if_oob(
             voltage, hlimit_low, hlimit_high, "Heater voltage limit", "V"
         )
-        self._com.writeline(f"HLIMIT {voltage:.3f}")
+        self._write_register("HLIMIT", voltage)
 
     @property
     def peltier_voltage_limit(self) -> float:
-        return float(self._com.getresponse("PLIMIT?"))
+        return self._read("PLIMIT?")
 
     @peltier_voltage_limit.setter
     def peltier_voltage_limit(self, voltage: float) -> None:
@@ -197,12 +629,12 @@ class SPDCDriver(object):
         self._raise_if_oob(
             voltage, plimit_low, plimit_high, "Peltier voltage limit", "V"
         )
-        self._com.writeline(f"PLIMIT {voltage:.3f}")
+        self._write_register("PLIMIT", voltage)
 
     @property
     def heater_temp(self) -> float:
         """Measures the instantaneous temperature near the crystal."""
-        return float(self._com.getresponse("HTEMP?"))
+        return self._read("HTEMP?")
 
     @heater_temp.setter
     def heater_temp(self, temp: float):
@@ -211,7 +643,7 @@ class SPDCDriver(object):
 
     @property
     def heater_temp_setpoint(self) -> float:
-        return float(self._com.getresponse("HSETTEMP?"))
+        return self._read("HSETTEMP?")
 
     @heater_temp_setpoint.setter
     def heater_temp_setpoint(self, temp: float) -> None:
@@ -222,11 +654,11 @@ class SPDCDriver(object):
         """
         htemp_low, htemp_high = 20, 100  # hardcoded based on firmware
         self._raise_if_oob(temp, htemp_low, htemp_high, "Heater temp setpoint", "°C")
-        self._com.writeline(f"HSETTEMP {temp:.3f}")
+        self._write_register("HSETTEMP", temp)
 
     @property
     def heater_temp_rate(self) -> float:
-        return float(self._com.getresponse("HRATE?"))
+        return self._read("HRATE?")
 
     @heater_temp_rate.setter
     def heater_temp_rate(self, rate: float) -> None:
@@ -245,16 +677,16 @@ class SPDCDriver(object):
         """
         hrate_low, hrate_high = 0.0, 1.0  # hardcoded based on firmware
         self._raise_if_oob(rate, hrate_low, hrate_high, "Heater temp ramp", "K/s")
-        self._com.writeline(f"HRATE {rate:.3f}")
+        self._write_register("HRATE", rate)
 
     @property
     def heater_temp_target(self) -> float:
-        return float(self._com.getresponse("HTARGET?"))
+        return self._read("HTARGET?")
 
     @property
     def peltier_temp(self) -> float:
         """Measures the instantaneous temperature near the laser."""
-        return float(self._com.getresponse("PTEMP?"))
+        return self._read("PTEMP?")
 
     @peltier_temp.setter
     def peltier_temp(self, temp: float):
@@ -263,7 +695,7 @@ class SPDCDriver(object):
 
     @property
     def peltier_temp_setpoint(self) -> float:
-        return float(self._com.getresponse("PSETTEMP?"))
+        return self._read("PSETTEMP?")
 
     @peltier_temp_setpoint.setter
     def peltier_temp_setpoint(self, temp: float) -> None:
@@ -274,11 +706,11 @@ class SPDCDriver(object):
         """
         ptemp_low, ptemp_high = 20, 50  # hardcoded based on firmware
         self._raise_if_oob(temp, ptemp_low, ptemp_high, "Peltier temp setpoint", "°C")
-        self._com.writeline(f"PSETTEMP {temp:.3f}")
+        self._write_register("PSETTEMP", temp)
 
     @property
     def hconstp(self) -> float:
-        return float(self._com.getresponse("HCONSTP?"))
+        return self._read("HCONSTP?")
 
     @hconstp.setter
     def hconstp(self, constant: float) -> None:
@@ -287,11 +719,11 @@ class SPDCDriver(object):
         self._raise_if_oob(
             constant, hconstp_low, hconstp_high, "Heater P constant", "V/K"
         )
-        self._com.writeline(f"HCONSTP {constant:.3f}")
+        self._write_register("HCONSTP", constant)
 
     @property
     def hconsti(self) -> float:
-        return float(self._com.getresponse("HCONSTI?"))
+        return self._read("HCONSTI?")
 
     @hconsti.setter
     def hconsti(self, constant: float) -> None:
@@ -300,11 +732,11 @@ class SPDCDriver(object):
         self._raise_if_oob(
             constant, hconsti_low, hconsti_high, "Heater I constant", "V/(Ks)"
         )
-        self._com.writeline(f"HCONSTI {constant:.3f}")
+        self._write_register("HCONSTI", constant)
 
     @property
     def hconstd(self) -> float:
-        return float(self._com.getresponse("HCONSTD?"))
+        return self._read("HCONSTD?")
 
     @hconstd.setter
     def hconstd(self, constant: float) -> None:
@@ -313,11 +745,11 @@ class SPDCDriver(object):
         self._raise_if_oob(
             constant, hconstd_low, hconstd_high, "Heater D constant", "Vs/K"
         )
-        self._com.writeline(f"HCONSTD {constant:.3f}")
+        self._write_register("HCONSTD", constant)
 
     @property
     def pconstp(self) -> float:
-        return float(self._com.getresponse("PCONSTP?"))
+        return self._read("PCONSTP?")
 
     @pconstp.setter
     def pconstp(self, constant: float) -> None:
@@ -326,11 +758,11 @@ class SPDCDriver(object):
         self._raise_if_oob(
             constant, pconstp_low, pconstp_high, "Peltier P constant", "V/K"
         )
-        self._com.writeline(f"PCONSTP {constant:.3f}")
+        self._write_register("PCONSTP", constant)
 
     @property
     def pconsti(self) -> float:
-        return float(self._com.getresponse("PCONSTI?"))
+        return self._read("PCONSTI?")
 
     @pconsti.setter
     def pconsti(self, constant: float) -> None:
@@ -339,11 +771,11 @@ class SPDCDriver(object):
         self._raise_if_oob(
             constant, pconsti_low, pconsti_high, "Peltier I constant", "V/(Ks)"
         )
-        self._com.writeline(f"PCONSTI {constant:.3f}")
+        self._write_register("PCONSTI", constant)
 
     @property
     def pconstd(self) -> float:
-        return float(self._com.getresponse("PCONSTD?"))
+        return self._read("PCONSTD?")
 
     @pconstd.setter
     def pconstd(self, constant: float) -> None:
@@ -352,13 +784,14 @@ class SPDCDriver(object):
         self._raise_if_oob(
             constant, pconstd_low, pconstd_high, "Peltier D constant", "Vs/K"
         )
-        self._com.writeline(f"PCONSTD {constant:.3f}")
+        self._write_register("PCONSTD", constant)
 
     @property
     def laser_current(self) -> float:
-        return float(self._com.getresponse("LCURRENT?"))
+        return self._read("LCURRENT?")
 
     @laser_current.setter
+    @synchronized
     def laser_current(self, current: float) -> None:
         """Sets the laser current, in mA.
 
@@ -367,13 +800,13 @@ class SPDCDriver(object):
         Raises:
             ValueError: `current` is not a valid number.
         """
-        lcurrent_low, lcurrent_high = 0, self.laser_current_limit
+        lcurrent_low, lcurrent_high = 0, self._cached_limit("LLIMIT?")
         self._raise_if_oob(current, lcurrent_low, lcurrent_high, "Laser current", "mA")
-        self._com.writeline(f"LCURRENT {current:.3f}")
+        self._write_register("LCURRENT", current)
 
     @property
     def laser_current_limit(self) -> float:
-        return float(self._com.getresponse("LLIMIT?"))
+        return self._read("LLIMIT?")
 
     @laser_current_limit.setter
     def laser_current_limit(self, current: float) -> None:
@@ -386,8 +819,9 @@ class SPDCDriver(object):
         self._raise_if_oob(
             current, llimit_low, llimit_high, "Laser current limit", "mA"
         )
-        self._com.writeline(f"LLIMIT {current:.3f}")
+        self._write_register("LLIMIT", current)
 
+    @synchronized
     def laser_on(self, current: float):
         """Switches on laser.
 
@@ -395,37 +829,68 @@ class SPDCDriver(object):
 
         Raises:
             ValueError: `current` is not a valid number.
-            RuntimeError: Laser is already switched on.
+            RuntimeError: Laser is already switched on, `emergency_off()` was
+                called meanwhile, in which case the laser is left off, or
+                called within a transaction.
         Note:
             The `ON` command are encapsulated within `laser_on()` instead of
             provisioning a standalone command, to prevent accidental laser
             delivery while it is switched off. Use case of `ON` is almost
             always tied to a laser ramp up.
         """
-        lcurrent_low, lcurrent_high = 0, self.laser_current_limit
+        self._raise_if_staging("laser_on")
+        emergencies = self._emergencies
+        lcurrent_low, lcurrent_high = 0, self._cached_limit("LLIMIT?")
         self._raise_if_oob(current, lcurrent_low, lcurrent_high, "Laser current", "mA")
-        if self.laser_current != 0:
+        status, laser_current = self.query_many(["STATUS?", "LCURRENT?"])
+        if laser_current != 0:
             raise RuntimeError(
                 "Laser is already switched on - use `SPDCDriver.laser_current` to "
                 "change the current"
             )
 
         # Switch on laser only, ignoring heater/peltier
-        self._power_on_laser()
+        self._power_on_laser(DeviceStatus.from_register(status))
         self._com.writeline("ON")
         self.laser_current = current  # target current
 
+        # Any emergency_off() after this check is written after the above
+        if self._emergencies != emergencies:
+            self._com.writeline(self.EMERGENCY_OFF_COMMAND)
+            raise RuntimeError("Laser switch on aborted by emergency_off()")
+
+    def emergency_off(self) -> None:
+        """Switches off the laser with a single write, and no round trips.
+
+        Sends the precomputed `EMERGENCY_OFF_COMMAND` without any validation
+        query, and waits for it to be transmitted. The device is not reserved,
+        so the command is sent even while another thread holds the device,
+        e.g. during a telemetry poll. A concurrent `cleanup()` does not discard
+        it, see `SerialConnection.write_urgent()`. As the command has no reply,
+        it cannot be mistaken for the reply to a query in flight. A `laser_on()`
+        in progress detects the call, and switches the laser off again.
+
+        Note:
+            Unlike `laser_off()`, the laser power line is left enabled, since
+            disabling it requires reading the power line states first. Follow
+            with `laser_off()` once the laser is safely off.
+        """
+        self._emergencies += 1
+        self._com.write_urgent(f"{self.EMERGENCY_OFF_COMMAND};".encode())
+
+    @synchronized
     def laser_off(self):
         """Switches off the laser."""
+        self._raise_if_staging("laser_off")
         self.laser_current = 0
 
         # Switch off laser only, ignoring heater/peltier
         self._com.writeline("OFF")
-        self._power_off_laser()
+        self._power_off_laser(self.decoded_status)
 
     @property
     def power(self) -> int:
-        return int(self._com.getresponse("POWER?"))
+        return self._read("POWER?")
 
     @power.setter
     def power(self, value: int) -> None:
@@ -444,17 +909,22 @@ class SPDCDriver(object):
             raise ValueError("Power can only take integer values (0, 1, 2, 3)")
         self._com.writeline(f"POWER {value}")
 
-    def _power_on_heater_peltier(self) -> None:
-        self.power |= 0b01
+    def _set_power_lines(self, status: DeviceStatus, value: int) -> None:
+        """Writes the power lines, skipping the write if already set."""
+        if status.power != value:
+            self.power = value
+
+    def _power_on_heater_peltier(self, status: DeviceStatus) -> None:
+        self._set_power_lines(status, status.power | 0b01)
 
-    def _power_off_heater_peltier(self) -> None:
-        self.power &= 0b10
+    def _power_off_heater_peltier(self, status: DeviceStatus) -> None:
+        self._set_power_lines(status, status.power & 0b10)
 
-    def _power_on_laser(self) -> None:
-        self.power |= 0b10
+    def _power_on_laser(self, status: DeviceStatus) -> None:
+        self._set_power_lines(status, status.power | 0b10)
 
-    def _power_off_laser(self) -> None:
-        self.power &= 0b01
+    def _power_off_laser(self, status: DeviceStatus) -> None:
+        self._set_power_lines(status, status.power & 0b01)
 
     @property
     def status(self) -> int:
@@ -465,4 +935,43 @@ class SPDCDriver(object):
         Power 1 --> 256 (0b01 0000 0000)
         Power 2 --> 512 (0b10 0000 0000)
         """
-        return int(self._com.getresponse("STATUS?"))
+        return self._read("STATUS?")
+
+    @property
+    def decoded_status(self) -> DeviceStatus:
+        """Returns the status register decoded into named flags.
+
+        Composite operations, e.g. `laser_off()`, use a single status read to
+        decide on the loop and power line states, instead of separate
+        "HLOOP?", "PLOOP?" and "POWER?" queries.
+        """
+        return DeviceStatus.from_register(self.status)
+
+
+def save_profile(path: str, config: Dict[str, float], name: str = "") -> None:
+    """Saves a device configuration as a named profile in a JSON file.
+
+    Args:
+        path: Path of the profile file.
+        config: Register values keyed by property name, e.g. as returned by
+            `SPDCDriver.read_config()`.
+        name: Profile name, e.g. the operating point.
+    """
+    with open(path, "w") as f:
+        json.dump({"name": name, "registers": config}, f, indent=4)
+
+
+def load_profile(path: str) -> Tuple[str, Dict[str, float]]:
+    """Loads a profile saved by `save_profile()`.
+
+    Returns:
+        Profile name and register values, see `SPDCDriver.apply_config()`.
+    Raises:
+        ValueError: File is not a valid profile.
+    """
+    with open(path) as f:
+        profile = json.load(f)
+    try:
+        return profile.get("name", ""), dict(profile["registers"])
+    except (AttributeError, KeyError, TypeError):
+        raise ValueError(f"'{path}' is not a valid profile")
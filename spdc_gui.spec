@@ -2,7 +2,7 @@
 
 
 a = Analysis(
-    ['spdc_GUI.py', 'serial_connection.py', 'spdc_driver_trim.py'],
+    ['spdc_GUI.py', 'serial_connection.py', 'spdc_driver_trim.py', 'spdc_scheduler.py', 'spdc_broker.py', 'serial_trace.py'],
     pathex=[],
     binaries=[],
     datas=[],
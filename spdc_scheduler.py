@@ -0,0 +1,141 @@
+"""Priority scheduling of SPDC driver commands.
+
+Runs all commands to an `SPDCDriver` from a single worker thread, so that
+safety commands (e.g. switching off the laser) are not stuck behind background
+telemetry polling. Commands are queued by priority class, then in order of
+submission, and a higher priority command preempts lower priority ones between
+individual commands.
+
+Commands are not interrupted once started, so the worst-case latency from
+submitting a `Priority.EMERGENCY` command to its execution is the duration of
+the command in flight. This is one round trip for a telemetry poll with
+`SPDCDriver.snapshot()`, but composite commands, e.g. switching on the
+temperature loops or the laser, take several round trips and short sleeps.
+
+Examples:
+    >>> scheduler = CommandScheduler(SPDCDriver("/dev/ttyACM0"))
+    >>> data = scheduler.call(lambda dev: dev.snapshot(), Priority.TELEMETRY)
+    >>> scheduler.submit(lambda dev: dev.laser_off(), Priority.EMERGENCY)
+"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from enum import IntEnum
+from typing import Any, Callable, Optional
+
+from spdc_driver_trim import SPDCDriver
+
+
+class Priority(IntEnum):
+    """Priority classes of commands, lower values run first."""
+
+    EMERGENCY = 0  # e.g. laser off
+    USER = 1  # setpoints and toggles requested by users
+    TELEMETRY = 2  # background polling
+
+
+class CommandScheduler:
+    """Runs commands on a device from a single worker thread, by priority."""
+
+    _STOP = 3  # queued after all other priorities, see `close()`
+    CALL_TIMEOUT: float = 10.0  # default wait of `call()`, in seconds
+
+    def __init__(self, device: SPDCDriver):
+        """Starts the worker thread.
+
+        Args:
+            device: Device which commands are run on.
+        """
+        self.device = device
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._order = itertools.count()  # first in, first out within a priority
+        self._closed = False
+        self._closing = threading.Lock()  # orders submissions before the stop
+        self._thread = threading.Thread(
+            target=self._run, name="CommandScheduler", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        command: Callable[[SPDCDriver], Any],
+        priority: Priority = Priority.USER,
+    ) -> Future:
+        """Queues a command, returning a future holding its result.
+
+        Args:
+            command: Function called with the device as its only argument.
+            priority: Priority class of the command.
+        Returns:
+            Future resolving to the return value of `command`, or to the
+            exception it raised.
+        Raises:
+            RuntimeError: Scheduler is closed.
+        """
+        future: Future = Future()
+        with self._closing:
+            if self._closed or not self._thread.is_alive():
+                raise RuntimeError("Command scheduler is closed")
+            self._queue.put((int(priority), next(self._order), command, future))
+        return future
+
+    def call(
+        self,
+        command: Callable[[SPDCDriver], Any],
+        priority: Priority = Priority.USER,
+        timeout: Optional[float] = CALL_TIMEOUT,
+    ) -> Any:
+        """Queues a command and waits for its result, see `submit()`.
+
+        The command is cancelled if it has not started by the timeout.
+
+        Raises:
+            concurrent.futures.TimeoutError: Result not available after timeout.
+            RuntimeError: Scheduler is closed.
+        """
+        future = self.submit(command, priority)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stops the worker thread once all queued commands are done.
+
+        Does not close the device. Commands submitted afterwards are refused.
+        """
+        with self._closing:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put((self._STOP, next(self._order), None, None))
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            priority, _, command, future = self._queue.get()
+            if priority == self._STOP:
+                self._fail_queued()
+                break
+            if not future.set_running_or_notify_cancel():
+                continue  # cancelled while queued
+            try:
+                result = command(self.device)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _fail_queued(self) -> None:
+        """Fails commands left in the queue, so that no caller waits forever."""
+        while True:
+            try:
+                _, _, _, future = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("Command scheduler is closed"))
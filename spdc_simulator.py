@@ -0,0 +1,318 @@
+"""Simulated SPDC driver board behind a pseudo-terminal, for testing without hardware.
+
+The simulator speaks the command set used by `SPDCDriver`, so that the driver,
+`SerialConnection`, the broker and the benchmarks run against it unchanged.
+It models a configurable response latency, the duration of saving settings,
+and a first-order thermal response of the heater and peltier stages.
+Requires a POSIX system.
+
+Usage:
+    python spdc_simulator.py --mode EPPS --latency 0.005
+
+The path of the simulated device is printed, e.g. /dev/pts/3. The GUI does not
+list pseudo-terminals, but can use the simulator through `spdc_broker.py`.
+
+Examples:
+    >>> sim = SPDCSimulator(mode="CPPS")
+    >>> device = SPDCDriver(sim.path)
+    >>> sim.close()
+"""
+
+import argparse
+import math
+import os
+import select
+import threading
+import time
+import tty
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class SPDCSimulator:
+    """Simulated SPDC driver board, served on a pseudo-terminal.
+
+    Temperatures relax exponentially towards their equilibrium, which is the
+    ambient temperature offset by the applied voltage. With a loop enabled,
+    the voltage is that needed to reach the setpoint, within the voltage limit.
+    The voltages only take effect with the heater / peltier power line on.
+    """
+
+    IDENTITIES = {
+        "CPPS": (
+            "S-15 Instruments SPDC source driver, firmware svn-7. Serial: SPDCSDR-99"
+        ),
+        "EPPS": (
+            "S-15 Instruments SPDC source driver, firmware svn-8. Serial: SPDCSDR-SIM"
+        ),
+    }
+
+    AMBIENT_TEMP = 25.0  # °C
+    HEATER_GAIN = 10.0  # equilibrium temperature offset, K/V
+    PELTIER_GAIN = -8.0  # K/V, cools for positive voltages
+    HEATER_TIME_CONSTANT = 20.0  # s
+    PELTIER_TIME_CONSTANT = 5.0  # s
+
+    # Register values after power up, integers for switches
+    DEFAULT_REGISTERS: Dict[str, Union[int, float]] = {
+        "HLOOP": 0,
+        "PLOOP": 0,
+        "POWER": 0,
+        "HVOLT": 0.0,
+        "PVOLT": 0.0,
+        "HLIMIT": 5.0,
+        "PLIMIT": 1.5,
+        "HSETTEMP": 30.0,
+        "HRATE": 0.0,
+        "PSETTEMP": 25.0,
+        "HCONSTP": 1.0,
+        "HCONSTI": 0.1,
+        "HCONSTD": 0.0,
+        "PCONSTP": 1.0,
+        "PCONSTI": 0.1,
+        "PCONSTD": 0.0,
+        "LCURRENT": 0.0,
+        "LLIMIT": 50.0,
+    }
+
+    # Valid ranges of writable registers, as enforced by the firmware.
+    # Strings refer to other registers, e.g. the voltage limits.
+    RANGES: Dict[str, Tuple[Union[float, str], Union[float, str]]] = {
+        "HLOOP": (0, 1),
+        "PLOOP": (0, 1),
+        "POWER": (0, 3),
+        "HVOLT": (0, "HLIMIT"),
+        "PVOLT": ("-PLIMIT", "PLIMIT"),
+        "HLIMIT": (0, 10),
+        "PLIMIT": (0, 2.5),
+        "HSETTEMP": (20, 100),
+        "HRATE": (0, 1),
+        "PSETTEMP": (20, 50),
+        "HCONSTP": (0, 10),
+        "HCONSTI": (0, 10),
+        "HCONSTD": (0, 10),
+        "PCONSTP": (0, 10),
+        "PCONSTI": (0, 10),
+        "PCONSTD": (0, 10),
+        "LCURRENT": (0, "LLIMIT"),
+        "LLIMIT": (0, 97),
+    }
+
+    HELP = [
+        "*IDN?  identity",
+        "*RST  reset to saved settings",
+        "SAVE  save settings",
+        "STATUS?  status register",
+        "ON / OFF  laser",
+        "POWER <0-3>  power lines",
+        "HLOOP, PLOOP <0|1>  temperature loops",
+        "HVOLT, PVOLT, HLIMIT, PLIMIT <V>  voltages",
+        "HSETTEMP, PSETTEMP <degC>, HRATE <K/s>  temperatures",
+        "HCONSTP, HCONSTI, HCONSTD, PCONSTP, PCONSTI, PCONSTD  loop constants",
+        "LCURRENT, LLIMIT <mA>  laser current",
+        "HTEMP?, PTEMP?, HTARGET?  measured temperatures",
+    ]
+
+    def __init__(
+        self,
+        mode: str = "CPPS",
+        latency: float = 0.002,
+        save_latency: float = 0.2,
+        identity: Optional[str] = None,
+    ):
+        """Opens the pseudo-terminal and starts serving commands.
+
+        Args:
+            mode: "CPPS" or "EPPS", selecting the reported identity.
+            latency: Delay before each reply, in seconds.
+            save_latency: Duration of saving settings, in seconds.
+            identity: Reply to "*IDN?", overriding `mode`.
+        """
+        self.identity = identity or self.IDENTITIES[mode]
+        self.latency = latency
+        self.save_latency = save_latency
+        self.registers = dict(self.DEFAULT_REGISTERS)
+        self.laser_on = False
+        self.heater_temp = self.AMBIENT_TEMP
+        self.peltier_temp = self.AMBIENT_TEMP
+        self.heater_target = self.registers["HSETTEMP"]
+        self.log: List[str] = []  # received commands
+        self._saved = dict(self.registers)
+        self._last_update = time.monotonic()
+        self._closed = threading.Event()
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.path = os.ttyname(self._slave)
+        self._thread = threading.Thread(
+            target=self._run, name="SPDCSimulator", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stops serving, and removes the pseudo-terminal."""
+        self._closed.set()
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _run(self) -> None:
+        buffer = b""
+        while not self._closed.is_set():
+            readable, _, _ = select.select([self._master], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                buffer += os.read(self._master, 1024)
+            except OSError:
+                return
+            # Commands are terminated by ';' or line endings
+            *commands, buffer = (
+                buffer.replace(b"\r", b";").replace(b"\n", b";").split(b";")
+            )
+            for command in commands:
+                command = command.decode(errors="replace").strip()
+                if not command:
+                    continue
+                self.log.append(command)
+                reply = self.handle(command)
+                if reply is not None:
+                    time.sleep(self.latency)
+                    lines = "".join(f"{line}\r\n" for line in reply)
+                    os.write(self._master, lines.encode())
+
+    def handle(self, command: str) -> Optional[List[str]]:
+        """Executes a single command, returning the reply lines, if any."""
+        self._update(time.monotonic())
+        name, *args = command.upper().split()
+        if name == "*IDN?":
+            return [self.identity]
+        if name == "HELP":
+            return self.HELP
+        if name == "*RST":
+            self.registers = dict(self._saved)
+            self.laser_on = False
+            return None
+        if name == "SAVE":
+            time.sleep(self.save_latency)
+            self._saved = dict(self.registers)
+            return ["Settings saved"]
+        if name == "ON":
+            self.laser_on = True
+            return None
+        if name == "OFF":
+            self.laser_on = False
+            return None
+        if name.endswith("?"):
+            value = self._query(name[:-1])
+            if value is None:
+                return ["Unknown command"]
+            return [str(value) if isinstance(value, int) else f"{value:.3f}"]
+        if name in self.RANGES and len(args) == 1:
+            return self._write(name, args[0])
+        return ["Unknown command"]
+
+    def _query(self, register: str) -> Optional[Union[int, float]]:
+        if register == "STATUS":
+            return (
+                self.registers["HLOOP"]
+                | self.registers["PLOOP"] << 1
+                | self.laser_on << 2
+                | self.registers["POWER"] << 8
+            )
+        if register == "HTEMP":
+            return self.heater_temp
+        if register == "PTEMP":
+            return self.peltier_temp
+        if register == "HTARGET":
+            return self.heater_target
+        if register == "HVOLT":
+            return self._heater_voltage()
+        if register == "PVOLT":
+            return self._peltier_voltage()
+        return self.registers.get(register)
+
+    def _write(self, register: str, argument: str) -> Optional[List[str]]:
+        try:
+            value = float(argument)
+        except ValueError:
+            return ["Invalid value"]
+        low, high = (self._bound(bound) for bound in self.RANGES[register])
+        if not low <= value <= high:
+            return [f"Value out of range [{low}, {high}]"]
+        if isinstance(self.DEFAULT_REGISTERS[register], int):
+            value = int(value)
+        self.registers[register] = value
+        return None
+
+    def _bound(self, bound: Union[float, str]) -> float:
+        if isinstance(bound, str):
+            sign = -1 if bound.startswith("-") else 1
+            return sign * self.registers[bound.lstrip("-")]
+        return bound
+
+    def _heater_voltage(self) -> float:
+        """Applied heater voltage, set by the loop if enabled."""
+        if not self.registers["POWER"] & 0b01:
+            return 0.0
+        if not self.registers["HLOOP"]:
+            return self.registers["HVOLT"]
+        needed = (self.heater_target - self.AMBIENT_TEMP) / self.HEATER_GAIN
+        return min(max(needed, 0.0), self.registers["HLIMIT"])
+
+    def _peltier_voltage(self) -> float:
+        """Applied peltier voltage, set by the loop if enabled."""
+        if not self.registers["POWER"] & 0b01:
+            return 0.0
+        if not self.registers["PLOOP"]:
+            return self.registers["PVOLT"]
+        needed = (self.registers["PSETTEMP"] - self.AMBIENT_TEMP) / self.PELTIER_GAIN
+        limit = self.registers["PLIMIT"]
+        return min(max(needed, -limit), limit)
+
+    def _update(self, now: float) -> None:
+        """Advances the thermal model to 'now'."""
+        dt = now - self._last_update
+        self._last_update = now
+
+        setpoint, rate = self.registers["HSETTEMP"], self.registers["HRATE"]
+        if rate == 0:
+            self.heater_target = setpoint
+        else:
+            step = min(abs(setpoint - self.heater_target), rate * dt)
+            self.heater_target += math.copysign(step, setpoint - self.heater_target)
+
+        heater_eq = self.AMBIENT_TEMP + self.HEATER_GAIN * self._heater_voltage()
+        peltier_eq = self.AMBIENT_TEMP + self.PELTIER_GAIN * self._peltier_voltage()
+        self.heater_temp += (heater_eq - self.heater_temp) * (
+            1 - math.exp(-dt / self.HEATER_TIME_CONSTANT)
+        )
+        self.peltier_temp += (peltier_eq - self.peltier_temp) * (
+            1 - math.exp(-dt / self.PELTIER_TIME_CONSTANT)
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulated SPDC driver board.")
+    parser.add_argument("--mode", choices=["CPPS", "EPPS"], default="CPPS")
+    parser.add_argument(
+        "--latency", type=float, default=0.002, help="reply delay in seconds"
+    )
+    parser.add_argument(
+        "--save-latency", type=float, default=0.2, help="duration of SAVE in seconds"
+    )
+    parser.add_argument("--identity", help="reply to *IDN?, overrides --mode")
+    args = parser.parse_args()
+
+    sim = SPDCSimulator(args.mode, args.latency, args.save_latency, args.identity)
+    print(sim.path, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+
+
+if __name__ == "__main__":
+    main()
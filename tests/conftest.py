@@ -0,0 +1,39 @@
+"""Fixtures running the driver against `SPDCSimulator`, see `spdc_simulator`."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if os.name != "posix":
+    pytest.skip("Simulator requires pseudo-terminals", allow_module_level=True)
+
+from serial_connection import SerialConnection  # noqa: E402
+from spdc_driver_trim import SPDCDriver  # noqa: E402
+from spdc_simulator import SPDCSimulator  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    simulator = SPDCSimulator()
+    yield simulator
+    simulator.close()
+
+
+@pytest.fixture(params=[False, True], ids=["plain", "reader"])
+def com(request, sim):
+    """Connection to the simulator, with and without the background reader."""
+    events = []
+    connection = SerialConnection(
+        sim.path, background_reader=request.param, event_callback=events.append
+    )
+    connection.events = events  # lines not matched to requests, in reader mode
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def device(com):
+    return SPDCDriver.from_connection(com, register_cache=True)
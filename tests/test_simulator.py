@@ -0,0 +1,100 @@
+"""Regression tests of the driver against the simulated device."""
+
+import time
+
+import pytest
+import serial
+
+from spdc_driver_trim import SPDCDriver
+
+
+def test_query_many_types_replies(device):
+    assert device.query_many(["PTEMP?", "POWER?", "LLIMIT?"]) == [25.0, 0, 50.0]
+
+
+def test_query_many_single_write(sim, device):
+    device.snapshot()
+    assert len(sim.log) == len(SPDCDriver.SNAPSHOT_QUERIES)
+    assert device.snapshot()["ptemp"] == 25.0
+
+
+def test_query_many_raises_on_missing_replies(sim, device):
+    sim.latency = 0.3
+    with pytest.raises(serial.SerialTimeoutException):
+        device.query_many(["PTEMP?", "POWER?"], timeout=0.05)
+
+
+def test_error_line_after_writeline_is_discarded(com):
+    com.writeline("HVOLT 99")  # out of range, replies with an error line
+    replies = [com.getresponse(query) for query in ("PTEMP?", "LLIMIT?", "HLIMIT?")]
+    assert replies == ["25.000", "50.000", "5.000"]
+
+
+def test_error_line_after_writeline_not_cached(com, device):
+    com.writeline("HVOLT 99")
+    assert device.laser_current_limit == 50.0
+    assert device.heater_voltage_limit == 5.0
+    assert device.laser_current_limit == 50.0
+
+
+def test_late_reply_not_cached(sim, com, device):
+    sim.latency = 0.25
+    assert com.getresponse("PTEMP?", timeout=0.05) == ""
+    sim.latency = 0.002
+    device.laser_current_limit  # may receive the late reply
+    assert com.reply_suspect
+    time.sleep(0.3)
+    assert device.laser_current_limit == 50.0
+    assert device.laser_current_limit == 50.0
+
+
+def test_unanswered_command_does_not_shift_replies(com):
+    assert com.getresponse("HCONSTP 1.5") == ""  # setters have no reply
+    assert [com.getresponse("PTEMP?") for _ in range(4)] == ["25.000"] * 4
+
+
+def test_reader_passes_late_reply_to_callback(sim):
+    from serial_connection import SerialConnection
+
+    events = []
+    com = SerialConnection(
+        sim.path, background_reader=True, event_callback=events.append
+    )
+    try:
+        sim.latency = 0.25
+        assert com.getresponse("HTEMP?", timeout=0.05) == ""
+        sim.latency = 0.002
+        assert com.getresponse("PTEMP?") in ("25.000", "")  # sent once quiet
+        assert [com.getresponse("LLIMIT?") for _ in range(3)] == ["50.000"] * 3
+        assert events == ["25.000"]
+    finally:
+        com.close()
+
+
+def test_transaction_sends_single_write_on_exit(sim, device):
+    with device.transaction():
+        device.pconstp = 0.8
+        device.peltier_temp_setpoint = 26
+        assert not any(command.startswith("PCONSTP ") for command in sim.log)
+    time.sleep(0.05)
+    writes = [command for command in sim.log if not command.endswith("?")]
+    assert writes == ["PCONSTP 0.800", "PSETTEMP 26.000"]
+    assert sim.registers["PCONSTP"] == 0.8
+    assert sim.registers["PSETTEMP"] == 26.0
+
+
+def test_transaction_discarded_on_error(sim, device):
+    with pytest.raises(KeyError):
+        with device.transaction():
+            device.pconstp = 0.8
+            raise KeyError
+    assert device.pconstp == 1.0
+    assert sim.registers["PCONSTP"] == 1.0
+
+
+def test_transaction_refuses_composite_operations(sim, device):
+    with pytest.raises(RuntimeError):
+        with device.transaction():
+            device.laser_on(20)
+    assert not sim.laser_on
+    assert sim.registers["LCURRENT"] == 0.0